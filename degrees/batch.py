@@ -0,0 +1,113 @@
+"""
+Batch degree queries for degrees.py
+
+Answering thousands of (source, target) pairs with one shortest_path call
+each repeats the same search over and over. Here the pairs are grouped by
+source, every source gets a single breadth-first search over its whole
+component, and all of its targets are read off the resulting distance and
+parent arrays. distances_from answers one-to-all queries the same way,
+reading off everyone reachable. Sources are spread across a process pool.
+"""
+import os
+from collections import defaultdict
+
+import degrees
+import shared
+from graph import trace_path
+
+
+def batch_degrees(pairs, processes=None, paths=False, shared_memory=False):
+    """
+    Answers many (source person_id, target person_id) pairs at once.
+
+    Returns a dict mapping every pair to its degrees of separation, or to
+    its list of (movie_id, person_id) steps if `paths` is set. Pairs that
+    aren't connected map to None.
+
+    `processes` is the size of the pool, 1 runs everything in this process.
+    Workers are forked and share the graph copy-on-write, with
+    `shared_memory` (or where fork isn't available) they are spawned and
+    attach to one shared copy of it instead, see shared.py.
+    """
+    graph = degrees.compact_graph()
+
+    # group the targets of every source, so each source is searched once
+    targets = defaultdict(set)
+    for source, target in pairs:
+        targets[graph.person_index(source)].add(graph.person_index(target))
+    tasks = [(source, sorted(found), paths) for source, found in targets.items()]
+    return translate(graph, answer_all(graph, tasks, processes, shared_memory), paths)
+
+
+def distances_from(sources, processes=None, shared_memory=False):
+    """
+    Answers one-to-all queries: returns a dict mapping every source
+    person_id to a dict mapping everyone reachable from it to their
+    degrees of separation.
+
+    Sources are spread across a pool like in batch_degrees.
+    """
+    graph = degrees.compact_graph()
+    tasks = [(graph.person_index(source), None, False) for source in dict.fromkeys(sources)]
+    results = {}
+    for source, found in answer_all(graph, tasks, processes, shared_memory):
+        results[graph.person_ids[source]] = {graph.person_ids[target]: d for target, d in found}
+    return results
+
+
+def answer_all(graph, tasks, processes, shared_memory):
+    """
+    Yields the answer_source result of every task, in any order.
+    """
+    if processes == 1 or len(tasks) <= 1:
+        with shared.in_process(graph):
+            yield from map(answer_source, tasks)
+        return
+
+    # the arrays are never written to, so either way the graph
+    # isn't copied or pickled for every worker
+    processes = processes or os.cpu_count()
+    with shared.graph_pool(graph, processes, shared_memory) as pool:
+        yield from pool.imap_unordered(answer_source, tasks, chunksize=chunk_size(len(tasks), processes))
+
+
+def answer_source(task):
+    """
+    Runs one single-source search and answers every target of it,
+    or with targets None gives the distance to everyone reachable.
+
+    Returns (source, [(target, degrees or index path)]).
+    """
+    source, targets, paths = task
+    distance, parent_person, parent_movie = shared.worker_graph.single_source(source)
+    if targets is None:
+        return source, [(target, d) for target, d in enumerate(distance) if d != -1]
+    answers = []
+    for target in targets:
+        if distance[target] == -1:
+            answers.append((target, None))
+        elif paths:
+            answers.append((target, trace_path(target, source, parent_person, parent_movie)))
+        else:
+            answers.append((target, distance[target]))
+    return source, answers
+
+
+def translate(graph, answers, paths):
+    """
+    Turns the index based answers of the workers back into person_ids.
+    """
+    results = {}
+    for source, found in answers:
+        source_id = graph.person_ids[source]
+        for target, answer in found:
+            if paths and answer is not None:
+                answer = [(graph.movie_ids[m], graph.person_ids[p]) for m, p in answer]
+            results[(source_id, graph.person_ids[target])] = answer
+    return results
+
+
+def chunk_size(tasks, processes):
+    # a few chunks per worker keeps them all busy without paying
+    # the inter-process round trip for every single source
+    return max(1, tasks // (processes * 4))
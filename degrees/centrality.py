@@ -0,0 +1,210 @@
+"""
+Sampled centrality of the co-star graph
+
+Exact closeness and betweenness need a search from every single person.
+Instead a random sample of pivot people gets one search each:
+
+- closeness: the average distance from the pivots to a person estimates
+  their average degrees of separation to everybody (Eppstein and Wang)
+- betweenness: Brandes' dependency accumulation from the pivots only,
+  scaled by people / pivots (Brandes and Pich)
+
+More pivots give better estimates for proportionally more time. Pivots
+are split into chunks that run in a process pool, and a progress callback
+is called as every chunk comes back.
+
+Usage: python centrality.py [directory] [pivots]
+"""
+import random
+import sys
+import time
+from array import array
+
+import degrees
+import shared
+
+
+class Centrality():
+    """
+    Estimated centrality of every person index of a CompactGraph.
+    """
+    def __init__(self, graph, pivots, distance_sum, reached, betweenness):
+        self.graph = graph
+        self.pivots = pivots
+        self.distance_sum = distance_sum
+        self.reached = reached
+        self.betweenness = betweenness
+
+    def average_distance(self, p):
+        """
+        Estimated average degrees of separation from person index p to
+        the people of their component, None if no pivot reached them.
+        """
+        if not self.reached[p] or not self.distance_sum[p]:
+            return None
+        return self.distance_sum[p] / self.reached[p]
+
+    def closeness(self, p):
+        average = self.average_distance(p)
+        return 0.0 if average is None else 1 / average
+
+    def top(self, measure="closeness", k=10, min_reached=None):
+        """
+        Returns the k most central people as (person_id, name, score).
+
+        Closeness only ranks people reached by at least `min_reached`
+        pivots (half of them by default), so tiny components whose few
+        members are all at distance 1 don't top the list.
+        """
+        if measure == "closeness":
+            if min_reached is None:
+                min_reached = max(1, len(self.pivots) // 2)
+            candidates = [p for p in range(self.graph.person_count) if self.reached[p] >= min_reached]
+            score = self.closeness
+        elif measure == "betweenness":
+            candidates = range(self.graph.person_count)
+            score = self.betweenness.__getitem__
+        else:
+            raise ValueError(f"unknown measure: {measure}")
+        best = sorted(candidates, key=score, reverse=True)[:k]
+        return [(self.graph.person_ids[p], self.graph.person_names[p], score(p)) for p in best]
+
+
+def estimate(graph=None, pivots=64, seed=None, processes=None, chunk=4, progress=None,
+             shared_memory=False):
+    """
+    Estimates closeness and betweenness from `pivots` random sources.
+
+    `chunk` pivots are searched per pool task, `progress(done, total)` is
+    called after every finished task. `processes` is the size of the pool,
+    1 runs everything in this process, `shared_memory` is passed on to
+    shared.graph_pool.
+    """
+    graph = graph if graph is not None else degrees.compact_graph()
+    sources = random.Random(seed).sample(range(graph.person_count), min(pivots, graph.person_count))
+    tasks = [sources[i:i + chunk] for i in range(0, len(sources), chunk)]
+
+    n = graph.person_count
+    distance_sum = array("d", [0.0]) * n
+    reached = array("l", [0]) * n
+    betweenness = array("d", [0.0]) * n
+
+    if processes == 1:
+        with shared.in_process(graph):
+            results = map(accumulate_chunk, tasks)
+            merge(results, distance_sum, reached, betweenness, len(sources), progress)
+    else:
+        with shared.graph_pool(graph, processes, shared_memory) as pool:
+            results = pool.imap_unordered(accumulate_chunk, tasks)
+            merge(results, distance_sum, reached, betweenness, len(sources), progress)
+
+    # every pivot stands in for n / pivots sources
+    if sources:
+        scale = n / len(sources)
+        for p in range(n):
+            betweenness[p] *= scale
+    return Centrality(graph, sources, distance_sum, reached, betweenness)
+
+
+def merge(results, distance_sum, reached, betweenness, total, progress):
+    done = 0
+    for count, chunk_sum, chunk_reached, chunk_betweenness in results:
+        for p in range(len(distance_sum)):
+            distance_sum[p] += chunk_sum[p]
+            reached[p] += chunk_reached[p]
+            betweenness[p] += chunk_betweenness[p]
+        done += count
+        if progress is not None:
+            progress(done, total)
+
+
+def accumulate_chunk(sources):
+    """
+    Runs Brandes' search from every source of one chunk.
+
+    Returns (sources searched, distance sums, pivots reaching, dependencies).
+    """
+    worker_graph = shared.worker_graph
+    n = worker_graph.person_count
+    distance_sum = array("d", [0.0]) * n
+    reached = array("l", [0]) * n
+    dependency_sum = array("d", [0.0]) * n
+    for source in sources:
+        order, distance, dependency = brandes(worker_graph, source)
+        for p in order:
+            distance_sum[p] += distance[p]
+            reached[p] += 1
+            if p != source:
+                dependency_sum[p] += dependency[p]
+    return len(sources), distance_sum, reached, dependency_sum
+
+
+def brandes(graph, source):
+    """
+    Single-source shortest path counting and dependency accumulation.
+
+    Returns (people in breadth-first order, distances, dependencies).
+    The same pair of people can share several movies, `stamp` makes sure
+    each co-star is only counted once per person.
+    """
+    n = graph.person_count
+    distance = array("l", [-1]) * n
+    paths = [0] * n
+    stamp = array("l", [-1]) * n
+    distance[source] = 0
+    paths[source] = 1
+
+    order = [source]
+    for v in order:
+        next_distance = distance[v] + 1
+        for m in graph.movies_of(v):
+            for w in graph.stars_of(m):
+                if stamp[w] == v or w == v:
+                    continue
+                stamp[w] = v
+                if distance[w] == -1:
+                    distance[w] = next_distance
+                    order.append(w)
+                if distance[w] == next_distance:
+                    paths[w] += paths[v]
+
+    # walk back from the farthest people, handing every person's
+    # dependency to the predecessors on their shortest paths
+    dependency = [0.0] * n
+    stamp = array("l", [-1]) * n
+    for w in reversed(order):
+        share = (1 + dependency[w]) / paths[w]
+        previous_distance = distance[w] - 1
+        for m in graph.movies_of(w):
+            for v in graph.stars_of(m):
+                if stamp[v] == w or distance[v] != previous_distance:
+                    continue
+                stamp[v] = w
+                dependency[v] += paths[v] * share
+    return order, distance, dependency
+
+
+def main():
+    if len(sys.argv) > 3:
+        sys.exit("Usage: python centrality.py [directory] [pivots]")
+    directory = sys.argv[1] if len(sys.argv) >= 2 else "large"
+    pivots = int(sys.argv[2]) if len(sys.argv) == 3 else 64
+
+    print("Loading data...")
+    degrees.load_data(directory, snapshot=True)
+    print("Data loaded.")
+
+    started = time.perf_counter()
+
+    def progress(done, total):
+        print(f"  {done}/{total} pivots searched ({time.perf_counter() - started:.1f}s)", flush=True)
+
+    centrality = estimate(pivots=pivots, progress=progress)
+    for measure in ("closeness", "betweenness"):
+        print(f"Most central by {measure}:")
+        for person_id, name, score in centrality.top(measure):
+            print(f"  {name} ({person_id}): {score:.4f}")
+
+
+if __name__ == "__main__":
+    main()
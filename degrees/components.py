@@ -0,0 +1,231 @@
+"""
+Connected components of the co-star graph
+
+A union-find over people, built by joining every star of a movie with
+the first star of that movie. Two people can only be connected by
+shortest_path if they end up with the same root, which makes
+"Not connected." answers O(1) instead of a search exhausting the
+source's whole component.
+
+Deleting data can split a component, which union-find can't undo. For
+the dict backend people therefore hang under separate component labels
+instead of under each other, so a piece that broke off can be moved to
+a label of its own without touching the rest (see ComponentIndex.split).
+"""
+from array import array
+from collections import Counter, defaultdict, deque
+from itertools import count
+
+from graph import INDEX_TYPE
+
+
+class ComponentIndex():
+    """
+    Union-find over people.
+
+    `parent` and `size` are dicts keyed by person_id for the dict backend
+    and arrays keyed by person index for a CompactGraph, in which case
+    `index` maps a person_id to its index.
+
+    For the dict backend `labels` hands out integer component labels,
+    every person's parent is a label and only labels are joined, so the
+    roots are always labels and their sizes count people.
+    """
+    def __init__(self, parent, size, index=None, labels=None):
+        self.parent = parent
+        self.size = size
+        self.index = index
+        self.labels = labels
+
+    @classmethod
+    def from_dicts(cls, people, movies):
+        components = cls({}, {}, labels=count())
+        for person_id in people:
+            components.add(person_id)
+        for movie in movies.values():
+            components.union_all(movie["stars"])
+        components.flatten(people)
+        # labels that were joined into others aren't pointed at anymore
+        for label in range(next(components.labels)):
+            if components.parent[label] != label:
+                del components.parent[label]
+                del components.size[label]
+        return components
+
+    @classmethod
+    def from_graph(cls, graph):
+        components = cls(array(INDEX_TYPE, range(graph.person_count)),
+                         array(INDEX_TYPE, [1]) * graph.person_count,
+                         graph.person_index)
+        for m in range(graph.movie_count):
+            components.union_all(graph.stars_of(m))
+        components.flatten(range(graph.person_count))
+        return components
+
+    def key(self, person_id):
+        return person_id if self.index is None else self.index(person_id)
+
+    def find(self, key):
+        """
+        Returns the root of `key`, halving the path on the way up.
+        """
+        parent = self.parent
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    def union(self, a, b):
+        """
+        Joins the components of `a` and `b`, returns the new root.
+        """
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return a
+        # hang the smaller tree under the bigger one
+        if self.size[a] < self.size[b]:
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] += self.size[b]
+        return a
+
+    def union_all(self, keys):
+        first = None
+        for key in keys:
+            if first is None:
+                first = key
+            else:
+                self.union(first, key)
+
+    def flatten(self, keys):
+        """
+        Points every key straight at its root, so that lookups right
+        after loading are a single step.
+        """
+        for key in keys:
+            self.parent[key] = self.find(key)
+
+    def add(self, key):
+        """
+        Adds a person on their own. Only valid for the dict backend.
+        """
+        self.parent[key] = self.new_label(1)
+
+    def remove(self, key):
+        """
+        Forgets a person. Only valid for the dict backend, the component
+        they leave behind may have to be split afterwards.
+        """
+        self.size[self.find(key)] -= 1
+        del self.parent[key]
+
+    def new_label(self, size):
+        label = next(self.labels)
+        self.parent[label] = label
+        self.size[label] = size
+        return label
+
+    def split(self, keys, neighbors):
+        """
+        Splits components after edges were removed, `keys` are the people
+        left on either side of them and `neighbors(key)` yields the current
+        co-stars of a key. Only valid for the dict backend.
+
+        Every piece a component broke into holds at least one of its keys.
+        So one breadth-first search per key is run, each expanding one
+        person in turn, and searches that meet are merged. A search that
+        runs out of people found a whole piece, which gets a new label.
+        Once a single search is left the rest is one piece, and it keeps
+        the old label without being searched any further.
+
+        That costs about the size of the pieces that broke off times the
+        number of keys, instead of the size of the component, which for
+        the giant component of IMDB is close to the whole graph.
+        """
+        groups = defaultdict(list)
+        for key in keys:
+            if key in self.parent:
+                groups[self.find(key)].append(key)
+        for root, starts in groups.items():
+            if len(starts) > 1:
+                for piece in broken_off(starts, neighbors):
+                    label = self.new_label(len(piece))
+                    for key in piece:
+                        self.parent[key] = label
+                    self.size[root] -= len(piece)
+
+    def same_component(self, a, b):
+        """
+        Returns whether the people with person_ids `a` and `b` are connected.
+        """
+        return self.find(self.key(a)) == self.find(self.key(b))
+
+    def component_size(self, person_id):
+        """
+        Returns the number of people in the component of `person_id`.
+        """
+        return self.size[self.find(self.key(person_id))]
+
+    def sizes(self):
+        """
+        Returns a Counter mapping component sizes to how many
+        components have that size.
+        """
+        keys = self.parent.keys() if isinstance(self.parent, dict) else range(len(self.parent))
+        # labels of components whose people were all removed have size 0
+        return Counter(self.size[key] for key in keys if self.parent[key] == key and self.size[key])
+
+
+def broken_off(starts, neighbors):
+    """
+    Runs the interleaved searches of ComponentIndex.split from the people
+    `starts` of one component, returns the list of people of every piece
+    found, all but the last piece standing.
+    """
+    # search of every person seen, and which search every search was merged into
+    owner = {}
+    merged = {}
+    queues, members = {}, {}
+    for search, start in enumerate(starts):
+        if start in owner:
+            continue
+        owner[start] = search
+        merged[search] = search
+        queues[search] = deque([start])
+        members[search] = [start]
+
+    def leader(search):
+        while merged[search] != search:
+            search = merged[search]
+        return search
+
+    pieces = []
+    while len(queues) > 1:
+        for search in list(queues):
+            if search not in queues:
+                # merged into another one earlier in this round
+                continue
+            if not queues[search]:
+                pieces.append(members.pop(search))
+                del queues[search]
+                if len(queues) == 1:
+                    break
+                continue
+            key = queues[search].popleft()
+            for neighbor in neighbors(key):
+                other = owner.get(neighbor)
+                if other is None:
+                    owner[neighbor] = search
+                    queues[search].append(neighbor)
+                    members[search].append(neighbor)
+                    continue
+                other = leader(other)
+                if other == search:
+                    continue
+                # the two searches met, the bigger one takes over the smaller
+                if len(members[other]) > len(members[search]):
+                    search, other = other, search
+                merged[other] = search
+                queues[search].extend(queues.pop(other))
+                members[search].extend(members.pop(other))
+    return pieces
@@ -1,7 +1,13 @@
 import csv
 import sys
+from array import array
 
-from util import Node, StackFrontier, QueueFrontier
+import landmarks
+from components import ComponentIndex
+from graph import INDEX_TYPE, CompactGraph, PeopleView, MoviesView, NamesView
+from nameindex import NameIndex, STRATEGIES
+from snapshot import load_or_build
+from util import Node, IndexedQueueFrontier, PriorityFrontier
 
 # Maps names to a set of corresponding person_ids
 names = {}
@@ -12,10 +18,88 @@ people = {}
 # Maps movie_ids to a dictionary of: title, year, stars (a set of person_ids)
 movies = {}
 
+# the dicts themselves, names, people and movies go back to these
+# whenever the data is loaded as dicts again
+dicts = (names, people, movies)
 
-def load_data(directory):
+# CompactGraph backing the dicts above when the data was loaded compact,
+# names, people and movies are then read-only views on top of it
+graph = None
+
+# CompactGraph copy of the dicts made by compact_graph, kept until they change
+dict_graph = None
+
+# ComponentIndex over people, when load_data was asked to build one
+components = None
+
+# LandmarkOracle loaded by load_landmarks
+oracle = None
+
+# whether a delta changed the loaded data, which then no longer matches
+# the files it was loaded from
+changed = False
+
+# NameIndex for prefix and fuzzy name lookups, when load_data built one
+name_index = None
+
+# Integer movie weights for weighted_path, computed once per kind of weight
+weight_tables = {}
+
+# Compiled masks of the MovieFilters searches were asked to use, by filter
+filter_masks = {}
+
+# most masks kept, the oldest one is dropped to make room for a new one
+MAX_FILTER_MASKS = 32
+
+
+def load_data(directory, compact=False, snapshot=False, index_components=False, index_names=False):
     """
     Load data from CSV files into memory.
+
+    With `compact` the data is stored as integer CSR arrays
+    (see graph.py) instead of dicts of sets.
+
+    With `snapshot` the compact data is memory mapped from a binary
+    snapshot next to the CSV files (see snapshot.py), which is written
+    on the first run and rebuilt whenever the CSV files change.
+
+    With `index_components` a union-find over people is built as well
+    (see components.py), so that shortest_path answers unreachable
+    pairs without searching.
+
+    With `index_names` a prefix and fuzzy name index is built as well
+    (see nameindex.py).
+
+    Any data loaded before is replaced, landmarks have to be loaded again.
+    """
+    global components, name_index, oracle, dict_graph, changed
+    oracle = None
+    dict_graph = None
+    changed = False
+    weight_tables.clear()
+    filter_masks.clear()
+    if snapshot:
+        use_graph(load_or_build(directory))
+    elif compact:
+        use_graph(CompactGraph.from_csv(directory))
+    else:
+        # emptied in place, other modules may hold on to the dicts
+        use_graph(None)
+        load_csv(directory)
+
+    if not index_components:
+        components = None
+    elif graph is not None:
+        components = ComponentIndex.from_graph(graph)
+    else:
+        components = ComponentIndex.from_dicts(people, movies)
+
+    name_index = NameIndex(names) if index_names else None
+
+
+def load_csv(directory):
+    """
+    Load the CSV files of `directory` into the names, people and movies dicts.
     """
     # Load people
     with open(f"{directory}/people.csv", encoding="utf-8") as f:
@@ -52,6 +136,68 @@ def load_data(directory):
                 pass
 
 
+def use_graph(compact_graph):
+    """
+    Makes `compact_graph` the backend of names, people and movies,
+    or goes back to the dicts, emptied, if it is None.
+    """
+    global graph, names, people, movies, dict_graph
+    graph = compact_graph
+    dict_graph = None
+    filter_masks.clear()
+    if graph is None:
+        # the same dict objects, other modules may hold on to them
+        for data in dicts:
+            data.clear()
+        names, people, movies = dicts
+    else:
+        names, people, movies = NamesView(graph), PeopleView(graph), MoviesView(graph)
+
+
+def load_landmarks(directory, count=16):
+    """
+    Loads the landmark distances persisted next to the CSV files of
+    `directory` (see landmarks.py), computing them on the first run.
+
+    Once a delta changed the data, the persisted distances belong to
+    another graph, so they are computed in memory and neither read nor
+    written.
+    """
+    global oracle
+    if changed:
+        oracle = landmarks.LandmarkOracle.build(compact_graph(), count)
+    else:
+        oracle = landmarks.load_or_build(compact_graph(), directory, count)
+    # masks translated for the old landmarks' graph
+    filter_masks.clear()
+
+
+def degree_bounds(source, target):
+    """
+    Returns (lower, upper) bounds on the degrees of separation between
+    two person_ids from the landmark distances, without any search.
+    """
+    if oracle is None:
+        raise ValueError("no landmarks loaded, call load_landmarks first")
+    return oracle.bounds(oracle.graph.person_index(source), oracle.graph.person_index(target))
+
+
+def compact_graph():
+    """
+    Returns the loaded CompactGraph, or a compact copy of the
+    people and movies dicts if the data was loaded as dicts.
+
+    The copy is only made once, loading data or applying a delta
+    (see delta.py) drops it.
+    """
+    global dict_graph
+    if graph is not None:
+        return graph
+    if dict_graph is None:
+        dict_graph = CompactGraph.from_dicts(people, movies)
+    return dict_graph
+
+
 def main():
     if len(sys.argv) > 2:
         sys.exit("Usage: python degrees.py [directory]")
@@ -59,7 +205,7 @@ def main():
 
     # Load data from files into memory
     print("Loading data...")
-    load_data(directory)
+    load_data(directory, snapshot=True)
     print("Data loaded.")
 
     source = person_id_for_name(input("Name: "))
@@ -89,22 +235,82 @@ def main():
 
 
 
-def shortest_path(source, target):
+def shortest_path(source, target, mode="bfs", movie_filter=None, **options):
     """
     Returns the shortest list of (movie_id, person_id) pairs
     that connect the source to the target.
 
+    `mode` picks the search engine, see SEARCH_MODES, `options` are
+    passed on to it.
+
+    With a `movie_filter` (see filters.py) only the movies it allows are
+    used. It is compiled into a mask on first use and the mask is reused
+    by later searches with an equal filter.
+
     If no possible path, returns None.
     """
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"unknown search mode: {mode}")
+    # a filter only removes edges, so people apart in the
+    # whole graph are apart in any filtered one too
+    if components is not None and not components.same_component(source, target):
+        return None
+    if movie_filter is not None:
+        options["allowed"] = movie_mask(movie_filter)
+    if graph is not None and mode in COMPACT_SEARCH_MODES:
+        return compact_path(source, target, mode, **options)
+    return SEARCH_MODES[mode](source, target, **options)
+
+
+def movie_mask(movie_filter):
+    """
+    Returns the compiled mask of a MovieFilter over the loaded movies,
+    compiling it only once for all equal filters.
+    """
+    if movie_filter not in filter_masks:
+        if graph is None:
+            remember_mask(movie_filter, movie_filter.compile_dicts(movies))
+        else:
+            remember_mask(movie_filter, movie_filter.compile_graph(graph))
+    return filter_masks[movie_filter]
+
+
+def remember_mask(key, mask):
+    if len(filter_masks) >= MAX_FILTER_MASKS:
+        del filter_masks[next(iter(filter_masks))]
+    filter_masks[key] = mask
+
+
+def compact_path(source, target, mode, allowed=None):
+    """
+    Runs a search directly on the arrays of the loaded CompactGraph,
+    translating ids to indices and back.
+    """
+    search = COMPACT_SEARCH_MODES[mode]
+    path = search(graph, graph.person_index(source), graph.person_index(target), allowed)
+    if path is None:
+        return None
+    return [(graph.movie_ids[m], graph.person_ids[p]) for m, p in path]
+
+
+def breadth_first_path(source, target, allowed=None):
+    """
+    Plain breadth-first search from the source, checking for
+    the target whenever a child is generated.
+
+    `allowed` is the compiled mask of a movie filter (see movie_mask).
+    """
+    # a person is 0 steps away from themselves, like in the other modes
+    if source == target:
+        return []
 
-    # TODO
     # action is movie_id
     # state is person_id
     # parent is the person_id of the previous state
     # since we are going to use breadth-first search, we will use a queue
 
     # initialize a frontier
-    frontier = QueueFrontier()
+    frontier = IndexedQueueFrontier()
 
     # initialize a starting node
     start = Node(state=source, parent=None, action=None)
@@ -129,7 +335,7 @@ def shortest_path(source, target):
         # add to the explored set to make sure that we don't enter an infinite loop
         explored.add(node.state)
 
-        for action, state in neighbors_for_person(node.state):
+        for action, state in neighbors_for_person(node.state, allowed):
 
             if not frontier.contains_state(state) and state not in explored:
                 child = Node(state=state, parent=node, action=action)
@@ -164,14 +370,285 @@ def shortest_path(source, target):
                     return path
 
 
-def person_id_for_name(name):
+def bidirectional_path(source, target, allowed=None):
+    """
+    Breadth-first search growing one frontier from the source and one
+    from the target, always expanding whichever frontier is smaller.
+
+    Returns the same path length as breadth_first_path but only explores
+    about two balls of half the radius instead of one of the full radius.
+    """
+    if source == target:
+        return []
+
+    # each side maps a person_id to the (movie_id, person_id) step
+    # that was used to reach it, the roots map to None
+    forward = {source: None}
+    backward = {target: None}
+
+    forward_frontier = [source]
+    backward_frontier = [target]
+
+    while forward_frontier and backward_frontier:
+
+        # always expand the side with fewer people waiting, the two
+        # balls then stay about the same size
+        if len(forward_frontier) <= len(backward_frontier):
+            forward_frontier, meeting = expand_level(forward_frontier, forward, backward, allowed)
+        else:
+            backward_frontier, meeting = expand_level(backward_frontier, backward, forward, allowed)
+
+        if meeting is not None:
+            return join_paths(meeting, forward, backward)
+
+    return None
+
+
+def expand_level(frontier, parents, other_parents, allowed=None):
+    """
+    Expands every person of one breadth-first level, recording the
+    parents of newly seen people.
+
+    Returns the next level and the first person that was already
+    reached from the other side (or None if the two sides didn't meet).
+
+    Both sides are kept disjoint until they meet, so every meeting found
+    while expanding one level gives a path of the same (shortest) length.
+    """
+    next_frontier = []
+    for person_id in frontier:
+        for movie_id, neighbor_id in neighbors_for_person(person_id, allowed):
+            if neighbor_id in parents:
+                continue
+            parents[neighbor_id] = (movie_id, person_id)
+            if neighbor_id in other_parents:
+                return next_frontier, neighbor_id
+            next_frontier.append(neighbor_id)
+    return next_frontier, None
+
+
+def join_paths(meeting, forward, backward):
+    """
+    Stitches the forward and backward parent maps together at the
+    person where the two searches met.
+    """
+    # walk back from the meeting point to the source
+    path = []
+    person_id = meeting
+    while forward[person_id] is not None:
+        movie_id, parent_id = forward[person_id]
+        path.append((movie_id, person_id))
+        person_id = parent_id
+    path.reverse()
+
+    # walk forward from the meeting point to the target, every step on
+    # this side was recorded as seen from the target so it is flipped
+    person_id = meeting
+    while backward[person_id] is not None:
+        movie_id, parent_id = backward[person_id]
+        path.append((movie_id, parent_id))
+        person_id = parent_id
+
+    return path
+
+
+def bipartite_path(source, target, allowed=None):
+    """
+    Breadth-first search that treats movies as nodes of their own.
+
+    Expanding a person only scans the casts of movies that no earlier
+    person has scanned yet: once any star of a movie is expanded, every
+    other star of it has been reached at the same or a shorter distance,
+    so scanning its cast again from a co-star can never find anything new.
+    """
+    if source == target:
+        return []
+
+    parents = {source: None}
+    seen_movies = set()
+    frontier = [source]
+
+    while frontier:
+        next_frontier = []
+        for person_id in frontier:
+            for movie_id in people[person_id]["movies"]:
+                if movie_id in seen_movies or (allowed is not None and movie_id not in allowed):
+                    continue
+                seen_movies.add(movie_id)
+                for star_id in movies[movie_id]["stars"]:
+                    if star_id in parents:
+                        continue
+                    parents[star_id] = (movie_id, person_id)
+                    if star_id == target:
+                        return join_paths(target, parents, {target: None})
+                    next_frontier.append(star_id)
+        frontier = next_frontier
+
+    return None
+
+
+def alt_path(source, target, allowed=None):
+    """
+    A* search guided by the landmark lower bounds, see landmarks.py.
+    """
+    if oracle is None:
+        raise ValueError("no landmarks loaded, call load_landmarks first")
+    index = oracle.graph
+    if allowed is not None and index is not graph:
+        # the oracle searches its own compact copy of the dicts, which
+        # needs a mask over its own movie indices, kept by the allowed
+        # movie_ids until load_landmarks replaces the oracle
+        key = ("alt", allowed)
+        if key not in filter_masks:
+            remember_mask(key, bytearray(index.movie_ids[m] in allowed for m in range(index.movie_count)))
+        allowed = filter_masks[key]
+    path = oracle.shortest_path(index.person_index(source), index.person_index(target), allowed)
+    if path is None:
+        return None
+    return [(index.movie_ids[m], index.person_ids[p]) for m, p in path]
+
+
+def weighted_path(source, target, weight="cast", heuristic=None, allowed=None):
+    """
+    Cheapest path where going through a movie costs its weight instead
+    of one step, found by Dijkstra search (A* when a heuristic is given).
+
+    `weight` picks the movie weights, see WEIGHTS. `heuristic(person_id)`
+    must never overestimate the remaining cost to the target, but needn't
+    be consistent: people reached more cheaply later are expanded again.
+    """
+    if source == target:
+        return []
+    weights = movie_weights(weight)
+
+    if graph is not None:
+        estimate = None
+        if heuristic is not None:
+            def estimate(p):
+                return heuristic(graph.person_ids[p])
+        path = graph.weighted_path(graph.person_index(source), graph.person_index(target),
+                                   weights, estimate, allowed)
+        if path is None:
+            return None
+        return [(graph.movie_ids[m], graph.person_ids[p]) for m, p in path]
+
+    cost = {source: 0}
+    frontier = PriorityFrontier()
+    frontier.add(Node(state=source, parent=None, action=None), 0)
+
+    while not frontier.empty():
+        node = frontier.remove()
+        if node.state == target:
+            path = []
+            while node.parent is not None:
+                path.append((node.action, node.state))
+                node = node.parent
+            path.reverse()
+            return path
+
+        for movie_id in people[node.state]["movies"]:
+            if allowed is not None and movie_id not in allowed:
+                continue
+            # the weight is looked up once per movie, not once per star
+            g = cost[node.state] + weights[movie_id]
+            for person_id in movies[movie_id]["stars"]:
+                if cost.get(person_id, g + 1) <= g:
+                    continue
+                cost[person_id] = g
+                priority = g if heuristic is None else g + heuristic(person_id)
+                frontier.add(Node(state=person_id, parent=node, action=movie_id), priority)
+
+    return None
+
+
+def movie_weights(weight):
+    """
+    Returns the integer weight of every movie for this kind of weight,
+    a dict keyed by movie_id or an array by movie index for a CompactGraph.
+    """
+    if weight not in WEIGHTS:
+        raise ValueError(f"unknown weight: {weight}")
+    if weight not in weight_tables:
+        weight_tables[weight] = WEIGHTS[weight]()
+    return weight_tables[weight]
+
+
+def cast_weights():
+    """
+    A movie costs as much as its cast is big, so small casts are preferred.
+    """
+    if graph is not None:
+        offsets = graph.movie_offsets
+        return array(INDEX_TYPE, (offsets[m + 1] - offsets[m] for m in range(graph.movie_count)))
+    return {movie_id: len(movie["stars"]) for movie_id, movie in movies.items()}
+
+
+def age_weights():
+    """
+    A movie costs one more than the number of years it is older than the
+    newest movie, so recent movies are preferred. Movies without a year
+    cost as much as the oldest one.
+    """
+    if graph is not None:
+        years = [graph.movie_years[m] for m in range(graph.movie_count)]
+    else:
+        years = [movie["year"] for movie in movies.values()]
+    known = [int(year) for year in years if year.isdigit()]
+    newest, oldest = (max(known), min(known)) if known else (0, 0)
+    ages = [1 + newest - (int(year) if year.isdigit() else oldest) for year in years]
+
+    if graph is not None:
+        return array(INDEX_TYPE, ages)
+    return dict(zip(movies, ages))
+
+
+# Movie weights weighted_path can use
+WEIGHTS = {
+    "cast": cast_weights,
+    "age": age_weights,
+}
+
+
+# Search engines that shortest_path can dispatch to
+SEARCH_MODES = {
+    "bfs": breadth_first_path,
+    "bidirectional": bidirectional_path,
+    "bipartite": bipartite_path,
+    "alt": alt_path,
+    "weighted": weighted_path,
+}
+
+# Search engines that run on the arrays when a CompactGraph is loaded,
+# the other modes fall back to the dict views
+COMPACT_SEARCH_MODES = {
+    "bfs": CompactGraph.breadth_first_path,
+    "bidirectional": CompactGraph.bidirectional_path,
+    "bipartite": CompactGraph.bipartite_path,
+}
+
+
+def person_id_for_name(name, strategy="interactive", birth_year=None, fuzzy=False):
     """
     Returns the IMDB id for a person's name,
     resolving ambiguities as needed.
+
+    `strategy` says how to resolve them: "interactive" asks on stdin,
+    the others are the non-interactive nameindex.STRATEGIES, where "all"
+    returns the list of every matching id. With `fuzzy` a name that isn't
+    known exactly is looked up in the name index instead.
     """
-    person_ids = list(names.get(name.lower(), set()))
+    if strategy != "interactive" and strategy not in STRATEGIES:
+        raise ValueError(f"unknown strategy: {strategy}")
+    if fuzzy and name_index is not None:
+        person_ids = list(name_index.search(name))
+    else:
+        person_ids = list(names.get(name.lower(), set()))
+    if strategy == "all":
+        return sorted(person_ids)
     if len(person_ids) == 0:
         return None
+    elif len(person_ids) > 1 and strategy != "interactive":
+        return STRATEGIES[strategy](person_ids, people, birth_year)
     elif len(person_ids) > 1:
         print(f"Which '{name}'?")
         for person_id in person_ids:
@@ -190,12 +667,16 @@ def person_id_for_name(name):
         return person_ids[0]
 
 
-def neighbors_for_person(person_id):
+def neighbors_for_person(person_id, allowed=None):
     """
     Returns (movie_id, person_id) pairs for people
     who starred with a given person.
+
+    With `allowed` (a compiled movie filter) other movies are skipped.
     """
     movie_ids = people[person_id]["movies"]
+    if allowed is not None:
+        movie_ids = movie_ids & allowed
     neighbors = set()
     for movie_id in movie_ids:
         for person_id in movies[movie_id]["stars"]:
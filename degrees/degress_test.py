@@ -6,9 +6,88 @@ Make sure that this file is in the same directory as degrees.py!
 'Why do we fall sir? So that we can learn to pick ourselves up.'
                                         - Batman Begins (2005)
 """
-from degrees import load_data, person_id_for_name, shortest_path
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import shutil
+from concurrent.futures import ProcessPoolExecutor
 
-load_data("large")
+import pytest
+
+import degrees
+import nameindex
+from degrees import (compact_graph, load_data, movie_weights, person_id_for_name, shortest_path,
+                     names, people, movies)
+from batch import batch_degrees, distances_from
+from centrality import estimate
+from components import ComponentIndex
+from delta import apply_delta
+from filters import MovieFilter
+from graph import CompactGraph
+from landmarks import LandmarkOracle
+from nameindex import NameIndex
+from server import DegreesServer, start_workers
+from snapshot import load_or_build
+from util import Node, IndexedStackFrontier, IndexedQueueFrontier, PriorityFrontier
+
+# the large dataset isn't part of the repository, the tests on it
+# only run once it has been downloaded next to this file
+LARGE = os.path.isdir("large")
+if LARGE:
+    load_data("large")
+
+
+# fixtures bringing their own data, tests using any of them don't need
+# the large dataset
+OWN_DATA = {"small", "path_graph", "no_data"}
+
+
+@pytest.fixture(autouse=True)
+def dataset(request):
+    """
+    Skips the tests on the large dataset while it isn't there.
+    """
+    if not LARGE and not OWN_DATA & set(request.fixturenames):
+        pytest.skip("the large dataset isn't downloaded")
+
+
+@pytest.fixture
+def no_data():
+    """
+    For tests that don't read any dataset.
+    """
+
+
+@pytest.fixture
+def small():
+    """
+    Loads the small dataset for one test, then goes back to the large one.
+    """
+    load_data("small")
+    yield
+    if LARGE:
+        load_data("large")
+
+
+@pytest.fixture
+def detour(small, tmp_path):
+    """
+    Loads a generated dataset where Ann and Dee starred together in an
+    old movie with a big cast, and are also linked by a chain of three
+    new movies with two stars each.
+    """
+    (tmp_path / "people.csv").write_text(
+        "id,name,birth\n1,Ann,1950\n2,Bob,1950\n3,Cid,1950\n4,Dee,1950\n"
+        "5,Eve,1950\n6,Fay,1950\n7,Gus,1950\n")
+    (tmp_path / "movies.csv").write_text(
+        "id,title,year\n10,Old,1950\n11,New 1,2000\n12,New 2,2000\n13,New 3,2000\n")
+    (tmp_path / "stars.csv").write_text(
+        "person_id,movie_id\n1,10\n4,10\n5,10\n6,10\n7,10\n"
+        "1,11\n2,11\n2,12\n3,12\n3,13\n4,13\n")
+    load_data(tmp_path)
+    return tmp_path
 
 # Most test cases provided by Ken Walker. Thank you!
 # source: https://edstem.org/us/courses/176/discussion/226814?answer=546980
@@ -65,4 +144,547 @@ def test_six_degree():
 def test_eight_degree():
     source = person_id_for_name("Juliane Banse")
     target = person_id_for_name("Julian Acosta")
-    assert len(shortest_path(source, target)) == 8
\ No newline at end of file
+    assert len(shortest_path(source, target)) == 8
+
+
+def test_bidirectional_six_degree():
+    source = person_id_for_name("Juliane Banse")
+    target = person_id_for_name("Bruce Davison")
+    assert len(shortest_path(source, target, mode="bidirectional")) == 6
+
+
+def test_bidirectional_eight_degree():
+    source = person_id_for_name("Juliane Banse")
+    target = person_id_for_name("Julian Acosta")
+    assert len(shortest_path(source, target, mode="bidirectional")) == 8
+
+
+def test_bidirectional_zero_degree():
+    source = person_id_for_name("Tim Zinnemann")
+    target = person_id_for_name("Lahcen Zinoun")
+    assert shortest_path(source, target, mode="bidirectional") is None
+
+
+def test_compact_eight_degree():
+    graph = CompactGraph.from_dicts(people, movies)
+    source = graph.person_index(person_id_for_name("Juliane Banse"))
+    target = graph.person_index(person_id_for_name("Julian Acosta"))
+    assert len(graph.breadth_first_path(source, target)) == 8
+    assert len(graph.bidirectional_path(source, target)) == 8
+
+
+def test_snapshot_eight_degree():
+    # the first call may build the snapshot, the second one maps it
+    load_or_build("large")
+    graph = load_or_build("large")
+    source = graph.person_index(person_id_for_name("Juliane Banse"))
+    target = graph.person_index(person_id_for_name("Julian Acosta"))
+    assert len(graph.bidirectional_path(source, target)) == 8
+
+
+def test_bipartite_six_degree():
+    source = person_id_for_name("Juliane Banse")
+    target = person_id_for_name("Bruce Davison")
+    assert len(shortest_path(source, target, mode="bipartite")) == 6
+
+
+def test_components_zero_degree():
+    components = ComponentIndex.from_dicts(people, movies)
+    source = person_id_for_name("Tim Zinnemann")
+    target = person_id_for_name("Lahcen Zinoun")
+    assert not components.same_component(source, target)
+    assert components.same_component(person_id_for_name("Juliane Banse"), person_id_for_name("Julian Acosta"))
+
+
+def test_batch_degrees():
+    pairs = [
+        (person_id_for_name("Jennifer Lawrence"), person_id_for_name("Tom Hanks")),
+        (person_id_for_name("Tom Cruise"), person_id_for_name("Lea Thompson")),
+        (person_id_for_name("Tom Cruise"), person_id_for_name("Tom Hanks")),
+        (person_id_for_name("Tim Zinnemann"), person_id_for_name("Lahcen Zinoun")),
+    ]
+    results = batch_degrees(pairs, processes=2)
+    assert [results[pair] for pair in pairs] == [2, 1, 2, None]
+    assert batch_degrees(pairs, processes=2, shared_memory=True) == results
+
+
+def test_small_distances_from(small):
+    sources = [person_id_for_name("Tom Cruise"), person_id_for_name("Emma Watson")]
+    distances = distances_from(sources, processes=1)
+    assert distances.keys() == set(sources)
+    for source, found in distances.items():
+        assert found[source] == 0
+        # everyone reachable, at the length of their shortest path
+        for target in people:
+            path = shortest_path(source, target)
+            assert found.get(target) == (None if path is None else len(path))
+    assert distances_from(sources, processes=2) == distances
+    assert distances_from(sources, processes=2, shared_memory=True) == distances
+
+
+def test_landmark_bounds_six_degree():
+    oracle = LandmarkOracle.build(CompactGraph.from_dicts(people, movies), count=8)
+    source = oracle.graph.person_index(person_id_for_name("Juliane Banse"))
+    target = oracle.graph.person_index(person_id_for_name("Bruce Davison"))
+    lower, upper = oracle.bounds(source, target)
+    assert lower <= 6 <= upper
+    assert len(oracle.shortest_path(source, target)) == 6
+
+
+def test_name_strategies():
+    assert person_id_for_name("Tom Hanks", strategy="all") == [person_id_for_name("Tom Hanks")]
+    assert person_id_for_name("Nobody Anybody", strategy="most_films") is None
+    index = NameIndex(names)
+    assert "tom hanks" in index.prefix("tom han")
+    assert index.fuzzy("tom hnaks")[0][1] == "tom hanks"
+
+
+def path_cost(path, weight):
+    weights = movie_weights(weight)
+    return sum(weights[movie_id] for movie_id, _ in path)
+
+
+def test_weighted_path():
+    source = person_id_for_name("Emma Watson")
+    target = person_id_for_name("Jennifer Lawrence")
+    path = shortest_path(source, target, mode="weighted", weight="cast")
+    assert_path(source, target, path)
+    fewest = shortest_path(source, target)
+    assert len(path) >= len(fewest)
+    assert path_cost(path, "cast") <= path_cost(fewest, "cast")
+    assert shortest_path(person_id_for_name("Tim Zinnemann"), person_id_for_name("Lahcen Zinoun"),
+                         mode="weighted", weight="age") is None
+
+
+def test_delta_updates(small, tmp_path):
+    (tmp_path / "people.csv").write_text("op,id,name,birth\nadd,delta1,Delta Person,2000\n")
+    (tmp_path / "stars.csv").write_text(
+        f"op,person_id,movie_id\nadd,delta1,{next(iter(people[person_id_for_name('Tom Hanks')]['movies']))}\n")
+    apply_delta(tmp_path)
+    assert len(shortest_path(person_id_for_name("Delta Person"), person_id_for_name("Tom Hanks"))) == 1
+
+    (tmp_path / "people.csv").write_text("op,id,name,birth\ndelete,delta1,,\n")
+    (tmp_path / "stars.csv").unlink()
+    apply_delta(tmp_path)
+    assert person_id_for_name("Delta Person") is None
+
+
+def test_centrality_estimate():
+    centrality = estimate(CompactGraph.from_dicts(people, movies), pivots=8, seed=0, processes=2)
+    top = centrality.top("betweenness", k=5)
+    assert len(top) == 5
+    assert top[0][2] >= top[-1][2] > 0
+
+
+def test_filtered_paths():
+    source = person_id_for_name("Emma Watson")
+    target = person_id_for_name("Jennifer Lawrence")
+    recent = MovieFilter(min_year=2000)
+    path = shortest_path(source, target, mode="bidirectional", movie_filter=recent)
+    assert len(path) >= 3
+    assert all(int(movies[movie_id]["year"]) >= 2000 for movie_id, _ in path)
+    assert shortest_path(source, target, movie_filter=MovieFilter(max_year=1800)) is None
+
+
+def assert_path(source, target, path):
+    """
+    Checks that every step of `path` is a movie both people starred in.
+    """
+    person_id = source
+    for movie_id, next_id in path:
+        assert {person_id, next_id} <= movies[movie_id]["stars"]
+        person_id = next_id
+    assert person_id == target
+
+
+@pytest.mark.parametrize("mode", list(degrees.SEARCH_MODES))
+@pytest.mark.parametrize("backend", ["dicts", "compact"])
+def test_small_same_person(small, tmp_path, mode, backend):
+    # every mode and backend agrees a person is 0 steps from themselves
+    load_data("small", compact=backend == "compact")
+    if mode == "alt":
+        shutil.copytree("small", tmp_path, dirs_exist_ok=True)
+        degrees.load_landmarks(tmp_path, count=2)
+    tom_hanks = person_id_for_name("Tom Hanks")
+    assert shortest_path(tom_hanks, tom_hanks, mode=mode) == []
+
+
+@pytest.mark.parametrize("mode", ["bfs", "bidirectional", "bipartite"])
+def test_small_search_modes(small, mode):
+    for source, target, separation in [("Tom Cruise", "Dustin Hoffman", 1),
+                                       ("Tom Cruise", "Tom Hanks", 2),
+                                       ("Dustin Hoffman", "Cary Elwes", 5)]:
+        source, target = person_id_for_name(source), person_id_for_name(target)
+        path = shortest_path(source, target, mode=mode)
+        assert len(path) == separation
+        assert_path(source, target, path)
+    assert shortest_path(person_id_for_name("Emma Watson"), person_id_for_name("Tom Hanks"), mode=mode) is None
+
+
+def test_small_compact(small, tmp_path):
+    shutil.copytree("small", tmp_path, dirs_exist_ok=True)
+    # the first call builds the snapshot, the second one maps it
+    load_or_build(tmp_path)
+    for graph in (CompactGraph.from_csv("small"), load_or_build(tmp_path)):
+        source = graph.person_index(person_id_for_name("Dustin Hoffman"))
+        target = graph.person_index(person_id_for_name("Cary Elwes"))
+        for search in (graph.breadth_first_path, graph.bidirectional_path, graph.bipartite_path):
+            path = search(source, target)
+            assert len(path) == 5
+            assert_path(graph.person_ids[source], graph.person_ids[target],
+                        [(graph.movie_ids[m], graph.person_ids[p]) for m, p in path])
+        assert graph.bidirectional_path(source, graph.person_index(person_id_for_name("Emma Watson"))) is None
+
+
+def test_small_backend_switch(small):
+    # the dicts imported from degrees stay the ones loaded into
+    load_data("small", compact=True)
+    assert degrees.people is not people
+    load_data("small")
+    assert degrees.people is people and degrees.movies is movies and degrees.names is names
+    assert people[person_id_for_name("Tom Hanks")]["name"] == "Tom Hanks"
+
+
+def test_small_components(small):
+    components = ComponentIndex.from_dicts(people, movies)
+    assert components.same_component(person_id_for_name("Dustin Hoffman"), person_id_for_name("Cary Elwes"))
+    assert not components.same_component(person_id_for_name("Emma Watson"), person_id_for_name("Tom Hanks"))
+    assert components.sizes() == {15: 1, 1: 1}
+
+
+def test_small_batch_degrees(small):
+    pairs = [
+        (person_id_for_name("Tom Cruise"), person_id_for_name("Dustin Hoffman")),
+        (person_id_for_name("Tom Cruise"), person_id_for_name("Tom Hanks")),
+        (person_id_for_name("Dustin Hoffman"), person_id_for_name("Cary Elwes")),
+        (person_id_for_name("Emma Watson"), person_id_for_name("Tom Hanks")),
+    ]
+    results = batch_degrees(pairs, processes=1)
+    assert [results[pair] for pair in pairs] == [1, 2, 5, None]
+    # the compact copy of the dicts is built once for every batch
+    assert compact_graph() is compact_graph()
+    assert batch_degrees(pairs, processes=2, shared_memory=True) == results
+
+
+def test_small_distances_from(small):
+    sources = [person_id_for_name("Tom Cruise"), person_id_for_name("Emma Watson")]
+    distances = distances_from(sources, processes=1)
+    assert distances.keys() == set(sources)
+    for source, found in distances.items():
+        assert found[source] == 0
+        # everyone reachable, at the length of their shortest path
+        for target in people:
+            path = shortest_path(source, target)
+            assert found.get(target) == (None if path is None else len(path))
+    assert distances_from(sources, processes=2) == distances
+    assert distances_from(sources, processes=2, shared_memory=True) == distances
+
+
+def test_small_landmark_bounds(small):
+    oracle = LandmarkOracle.build(CompactGraph.from_dicts(people, movies), count=2)
+    source = oracle.graph.person_index(person_id_for_name("Dustin Hoffman"))
+    target = oracle.graph.person_index(person_id_for_name("Cary Elwes"))
+    lower, upper = oracle.bounds(source, target)
+    assert lower <= 5 <= upper
+    assert len(oracle.shortest_path(source, target)) == 5
+    assert oracle.shortest_path(source, oracle.graph.person_index(person_id_for_name("Emma Watson"))) is None
+
+
+def test_small_name_strategies(small):
+    assert person_id_for_name("Tom Hanks", strategy="all") == ["158"]
+    assert person_id_for_name("Nobody Anybody", strategy="most_films") is None
+    index = NameIndex(names)
+    assert {"tom cruise", "tom hanks"} <= set(index.prefix("tom"))
+    assert index.fuzzy("kevin bcaon")[0][1] == "kevin bacon"
+
+
+def test_name_index_updates(no_data, monkeypatch):
+    # tiny blocks, so names split and empty them
+    monkeypatch.setattr(nameindex, "BLOCK", 2)
+    rng = random.Random(0)
+    names = {f"name {i:03}": {str(i)} for i in range(0, 60, 2)}
+    index = NameIndex(names)
+    expected = sorted(names)
+    for _ in range(300):
+        key = f"name {rng.randrange(60):03}"
+        if key in index.entry_of:
+            index.remove(key)
+            expected.remove(key)
+        else:
+            index.add(key)
+            expected.append(key)
+            expected.sort()
+        assert list(index.keys) == expected
+        assert all(len(block) <= 4 for block in index.keys.blocks)
+    prefix = [key for key in expected if key.startswith("name 01")]
+    assert index.prefix("name 01", limit=100) == prefix
+    assert index.prefix("name 01", limit=2) == prefix[:2]
+    assert index.prefix("zzz") == []
+    if expected:
+        assert index.fuzzy(expected[0])[0] == (1.0, expected[0])
+
+
+def test_small_centrality(small):
+    # with every person as a pivot the estimate is exact: Kevin Bacon
+    # is on every path between the 6 people of A Few Good Men and Rain
+    # Man and the 8 people of the other movies
+    centrality = estimate(CompactGraph.from_dicts(people, movies), pivots=16, seed=0, processes=1)
+    assert centrality.top("betweenness", k=1) == [("102", "Kevin Bacon", 96.0)]
+
+
+def test_small_filtered_paths(small):
+    source = person_id_for_name("Tom Cruise")
+    target = person_id_for_name("Tom Hanks")
+    path = shortest_path(source, target, mode="bidirectional", movie_filter=MovieFilter(min_year=1990))
+    assert len(path) == 2
+    assert all(int(movies[movie_id]["year"]) >= 1990 for movie_id, _ in path)
+    # Rain Man (1988) is Dustin Hoffman's only movie
+    assert shortest_path(person_id_for_name("Dustin Hoffman"), source, movie_filter=MovieFilter(min_year=1990)) is None
+
+
+def test_small_filter_masks(small):
+    source = person_id_for_name("Tom Cruise")
+    target = person_id_for_name("Tom Hanks")
+    # equal filters share one compiled mask
+    for _ in range(5):
+        shortest_path(source, target, movie_filter=MovieFilter(min_year=1990))
+    assert len(degrees.filter_masks) == 1
+    assert MovieFilter(min_year=1990) == MovieFilter(min_year=1990) != MovieFilter(max_year=1990)
+
+    degrees.oracle = LandmarkOracle.build(compact_graph(), count=2)
+    for year, separation in [(1990, 2), (1980, 2), (1995, None)]:
+        path = shortest_path(source, target, mode="alt", movie_filter=MovieFilter(min_year=year))
+        assert (path and len(path)) == separation
+
+
+def test_small_server(small):
+    async def get(port, target):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(f"GET {target} HTTP/1.0\r\n\r\n".encode("latin-1"))
+        status = int((await reader.readline()).split()[1])
+        body = json.loads((await reader.read()).split(b"\r\n\r\n", 1)[1])
+        writer.close()
+        return status, body
+
+    async def run():
+        with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("fork")) as pool:
+            start_workers(pool)
+            server = DegreesServer(pool)
+            listener = await asyncio.start_server(server.handle, "127.0.0.1", 0)
+            port = listener.sockets[0].getsockname()[1]
+            async with listener:
+                found = await get(port, "/path?source=Tom%20Cruise&target=Tom%20Hanks")
+                # a pool that can't take searches anymore
+                pool.shutdown()
+                failed = await get(port, "/path?source=Tom%20Cruise&target=Tom%20Hanks")
+                metrics = await get(port, "/metrics")
+        return found, failed, metrics
+
+    found, failed, metrics = asyncio.run(run())
+    assert found[0] == 200 and found[1]["degrees"] == 2
+    assert failed[0] == 500 and "error" in failed[1]
+    assert metrics[1]["endpoints"]["/path"]["count"] == 2
+    assert metrics[1]["endpoints"]["/path"]["errors"] == 1
+
+
+def test_weighted_detour(detour):
+    ann, dee = person_id_for_name("Ann"), person_id_for_name("Dee")
+    assert shortest_path(ann, dee) == [("10", "4")]
+    # the old movie costs 51 years against 1 for each new one
+    path = shortest_path(ann, dee, mode="weighted", weight="age")
+    assert path == [("11", "2"), ("12", "3"), ("13", "4")]
+    assert path_cost(path, "age") == 3
+    # its cast of 5 is cheaper than three casts of 2
+    path = shortest_path(ann, dee, mode="weighted", weight="cast")
+    assert path == [("10", "4")]
+    assert path_cost(path, "cast") == 5
+
+    graph = CompactGraph.from_csv(detour)
+    weights = [len(graph.stars_of(m)) for m in range(graph.movie_count)]
+    path = graph.weighted_path(graph.person_index(ann), graph.person_index(dee), weights)
+    assert [(graph.movie_ids[m], graph.person_ids[p]) for m, p in path] == [("10", "4")]
+    # with the old movie filtered out only the chain is left
+    allowed = MovieFilter(min_year=2000).compile_graph(graph)
+    path = graph.weighted_path(graph.person_index(ann), graph.person_index(dee), weights, allowed=allowed)
+    assert [(graph.movie_ids[m], graph.person_ids[p]) for m, p in path] == [("11", "2"), ("12", "3"), ("13", "4")]
+
+
+@pytest.fixture
+def shortcut(small, tmp_path):
+    """
+    Loads a generated dataset where S reaches T through A (cost 1 + 1
+    + 4 by age) or through B (cost 2 + 1 + 4), both via C.
+    """
+    (tmp_path / "people.csv").write_text("id,name,birth\n1,S,\n2,A,\n3,B,\n4,C,\n5,T,\n")
+    (tmp_path / "movies.csv").write_text(
+        "id,title,year\n10,SA,2000\n11,SB,1999\n12,AC,2000\n13,BC,2000\n14,CT,1997\n")
+    (tmp_path / "stars.csv").write_text(
+        "person_id,movie_id\n1,10\n2,10\n1,11\n3,11\n2,12\n4,12\n3,13\n4,13\n4,14\n5,14\n")
+    load_data(tmp_path)
+    return tmp_path
+
+
+def test_weighted_inconsistent_heuristic(shortcut):
+    # A is 5 from T, so 4 never overestimates, but it isn't consistent:
+    # C is first reached through B before A's cheaper route gets to it
+    cheapest = [("10", "2"), ("12", "4"), ("14", "5")]
+    assert degrees.weighted_path("1", "5", weight="age") == cheapest
+
+    def heuristic(person_id):
+        return 4 if person_id == "2" else 0
+    assert degrees.weighted_path("1", "5", weight="age", heuristic=heuristic) == cheapest
+
+    graph = CompactGraph.from_csv(shortcut)
+    weights = [1, 2, 1, 1, 4]
+    assert [graph.movie_years[m] for m in range(graph.movie_count)] == ["2000", "1999", "2000", "2000", "1997"]
+    path = graph.weighted_path(graph.person_index("1"), graph.person_index("5"), weights,
+                               lambda p: heuristic(graph.person_ids[p]))
+    assert [(graph.movie_ids[m], graph.person_ids[p]) for m, p in path] == cheapest
+
+
+def component_partition(components):
+    roots = {}
+    for person_id in people:
+        roots.setdefault(components.find(person_id), set()).add(person_id)
+    return sorted(sorted(members) for members in roots.values())
+
+
+def test_delta_splits_components(small, tmp_path):
+    load_data("small", index_components=True)
+    # Tom Cruise leaves Rain Man, which breaks off with its other 3 stars
+    (tmp_path / "stars.csv").write_text("op,person_id,movie_id\ndelete,129,95953\n")
+    apply_delta(tmp_path)
+    assert not shortest_path(person_id_for_name("Dustin Hoffman"), person_id_for_name("Tom Hanks"))
+    assert degrees.components.sizes() == {12: 1, 3: 1, 1: 1}
+    assert component_partition(degrees.components) == component_partition(ComponentIndex.from_dicts(people, movies))
+
+    # without Kevin Bacon A Few Good Men and Apollo 13 fall apart too
+    (tmp_path / "stars.csv").unlink()
+    (tmp_path / "people.csv").write_text("op,id,name,birth\ndelete,102,,\n")
+    apply_delta(tmp_path)
+    assert degrees.components.sizes() == {8: 1, 3: 2, 1: 1}
+    assert component_partition(degrees.components) == component_partition(ComponentIndex.from_dicts(people, movies))
+
+    # and Tom Cruise going back to Rain Man joins two of them again
+    (tmp_path / "people.csv").unlink()
+    (tmp_path / "stars.csv").write_text("op,person_id,movie_id\nadd,129,95953\n")
+    apply_delta(tmp_path)
+    assert degrees.components.sizes() == {8: 1, 6: 1, 1: 1}
+
+
+def test_landmarks_after_delta(small, tmp_path):
+    data = tmp_path / "data"
+    shutil.copytree("small", data)
+    load_data(data)
+    degrees.load_landmarks(data, count=2)
+    persisted = (data / "degrees.landmarks").read_bytes()
+    hoffman, elwes = person_id_for_name("Dustin Hoffman"), person_id_for_name("Cary Elwes")
+    assert degrees.degree_bounds(hoffman, elwes)[0] > 1
+
+    # Dustin Hoffman joins one of Cary Elwes's movies
+    delta = tmp_path / "delta"
+    delta.mkdir()
+    (delta / "stars.csv").write_text(f"op,person_id,movie_id\nadd,{hoffman},{min(people[elwes]['movies'])}\n")
+    apply_delta(delta)
+    degrees.load_landmarks(data, count=2)
+    assert degrees.degree_bounds(hoffman, elwes) == (1, 1)
+    assert len(shortest_path(hoffman, elwes, mode="alt")) == 1
+    # the distances of the files are left alone
+    assert (data / "degrees.landmarks").read_bytes() == persisted
+
+    # and loading the files again reads them again
+    load_data(data)
+    degrees.load_landmarks(data, count=2)
+    assert degrees.degree_bounds(hoffman, elwes)[0] > 1
+
+
+@pytest.fixture
+def path_graph():
+    """
+    Returns the co-stars of a path of 10000 people, every neighbor pair
+    starring in one movie, and their ComponentIndex.
+    """
+    n = 10000
+    costars = {str(i): [str(j) for j in (i - 1, i + 1) if 0 <= j < n] for i in range(n)}
+    movies = {i: {"stars": [str(i), str(i + 1)]} for i in range(n - 1)}
+    return costars, ComponentIndex.from_dicts(costars, movies)
+
+
+def test_component_split_cost(path_graph):
+    costars, components = path_graph
+    expanded = []
+
+    def neighbors(key):
+        expanded.append(key)
+        return costars[key]
+
+    # cutting off the first two people only searches around them
+    costars["1"].remove("2")
+    costars["2"].remove("1")
+    components.split(["1", "2"], neighbors)
+    assert components.sizes() == {2: 1, len(costars) - 2: 1}
+    assert not components.same_component("1", "2")
+    assert len(expanded) <= 4
+
+
+def node(state):
+    return Node(state=state, parent=None, action=None)
+
+
+@pytest.mark.parametrize("frontier, order", [
+    (IndexedStackFrontier, [3, 2, 2, 1]),
+    (IndexedQueueFrontier, [1, 2, 2, 3]),
+])
+def test_indexed_frontiers(no_data, frontier, order):
+    frontier = frontier()
+    for state in [1, 2, 2, 3]:
+        frontier.add(node(state))
+    assert len(frontier) == 4
+    removed = []
+    while not frontier.empty():
+        removed.append(frontier.remove().state)
+        # a state stays in the frontier while any of its nodes does
+        assert frontier.contains_state(2) == (removed.count(2) < 2)
+    assert removed == order
+    assert not frontier.contains_state(1)
+    with pytest.raises(Exception):
+        frontier.remove()
+
+
+def test_priority_frontier(no_data):
+    frontier = PriorityFrontier()
+    frontier.add(node("a"), 5)
+    frontier.add(node("b"), 3)
+    frontier.add(node("c"), 3)
+    assert len(frontier) == 3
+    assert frontier.best_priority("a") == 5
+    # ties come out in the order they went in
+    assert frontier.remove_with_priority()[1].state == "b"
+    assert not frontier.contains_state("b")
+    assert frontier.best_priority("b") is None
+    assert frontier.remove().state == "c"
+    assert frontier.remove().state == "a"
+    assert frontier.empty()
+
+
+def test_priority_frontier_decrease_key(no_data):
+    frontier = PriorityFrontier()
+    old, new = Node(state="a", parent=None, action="old"), Node(state="a", parent=None, action="new")
+    frontier.add(old, 5)
+    frontier.add(node("b"), 4)
+    frontier.add(new, 2)
+    # the state waits once, with its newest node and priority
+    assert len(frontier) == 2
+    assert frontier.best_priority("a") == 2
+    assert frontier.remove_with_priority() == (2, new)
+    # the replaced entry is skipped, not handed out as a second "a"
+    assert not frontier.contains_state("a")
+    assert frontier.remove().state == "b"
+    assert frontier.empty()
+    with pytest.raises(Exception):
+        frontier.remove()
+
+    # a removed state can be added again
+    frontier.add(old, 1)
+    assert frontier.contains_state("a")
+    assert frontier.remove() is old
@@ -0,0 +1,192 @@
+"""
+Incremental updates for degrees.py
+
+A delta is a directory holding any of people.csv, movies.csv and
+stars.csv with the usual columns plus an `op` column, which is either
+"add" or "delete". apply_delta applies it to the loaded dicts and keeps
+the derived indexes (components, name index, weight tables) in step,
+touching only the rows of the delta and the people and movies they
+mention.
+
+Deleting a star or a person can split a component, which union-find can't
+undo, so the pieces that broke off are searched for from the people who
+lost an edge (see ComponentIndex.split).
+Landmark distances can't be patched at all and are dropped, call
+degrees.load_landmarks again to rebuild them. The ones persisted next to
+the CSV files no longer match the data, so that computes them in memory.
+"""
+import csv
+import os
+
+import degrees
+
+# which kind of row every delta file holds, in the order they are applied
+DELTA_FILES = {
+    "people.csv": "person",
+    "movies.csv": "movie",
+    "stars.csv": "star",
+}
+
+
+def apply_delta(directory):
+    """
+    Applies the delta CSV files of `directory` to the loaded data.
+
+    Returns a dict counting the applied rows per file and operation.
+    """
+    if degrees.graph is not None:
+        raise ValueError("incremental updates need the dict backend, "
+                         "load the data without compact or snapshot")
+
+    update = Update()
+    counts = {}
+    for filename, kind in DELTA_FILES.items():
+        path = os.path.join(directory, filename)
+        if not os.path.exists(path):
+            continue
+        with open(path, encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                op = row["op"]
+                if op not in ("add", "delete"):
+                    raise ValueError(f"unknown op {op!r} in {path}")
+                getattr(update, f"{op}_{kind}")(row)
+                counts[(filename, op)] = counts.get((filename, op), 0) + 1
+    update.finish()
+    return counts
+
+
+class Update():
+    """
+    One delta being applied, collecting what the derived indexes need
+    to catch up on once every row is in.
+    """
+    def __init__(self):
+        # people who lost an edge, their components may have split
+        self.split = set()
+        # movies whose cast changed, for the cast weights
+        self.recast = set()
+        self.movies_changed = False
+
+    def add_person(self, row):
+        person_id, name = row["id"], row["name"]
+        person = degrees.people.get(person_id)
+        if person is not None:
+            # adding a known person updates their name and birth
+            forget_name(person_id, person["name"])
+            person["name"], person["birth"] = name, row["birth"]
+        else:
+            degrees.people[person_id] = {"name": name, "birth": row["birth"], "movies": set()}
+            if degrees.components is not None:
+                degrees.components.add(person_id)
+
+        degrees.names.setdefault(name.lower(), set()).add(person_id)
+        if degrees.name_index is not None:
+            degrees.name_index.add(name.lower())
+
+    def delete_person(self, row):
+        person_id = row["id"]
+        person = degrees.people.pop(person_id, None)
+        if person is None:
+            return
+        for movie_id in person["movies"]:
+            stars = degrees.movies[movie_id]["stars"]
+            stars.discard(person_id)
+            self.split.update(stars)
+            self.recast.add(movie_id)
+
+        forget_name(person_id, person["name"])
+        if degrees.components is not None:
+            degrees.components.remove(person_id)
+        self.split.discard(person_id)
+
+    def add_movie(self, row):
+        movie_id = row["id"]
+        movie = degrees.movies.get(movie_id)
+        if movie is not None:
+            # adding a known movie updates its title and year
+            movie["title"], movie["year"] = row["title"], row["year"]
+        else:
+            degrees.movies[movie_id] = {"title": row["title"], "year": row["year"], "stars": set()}
+            self.recast.add(movie_id)
+        self.movies_changed = True
+
+    def delete_movie(self, row):
+        movie_id = row["id"]
+        movie = degrees.movies.pop(movie_id, None)
+        if movie is None:
+            return
+        for person_id in movie["stars"]:
+            degrees.people[person_id]["movies"].discard(movie_id)
+        self.split.update(movie["stars"])
+        self.recast.add(movie_id)
+        self.movies_changed = True
+
+    def add_star(self, row):
+        person_id, movie_id = row["person_id"], row["movie_id"]
+        # rows pointing to unknown people or movies are skipped,
+        # the same way load_data does
+        if person_id not in degrees.people or movie_id not in degrees.movies:
+            return
+        stars = degrees.movies[movie_id]["stars"]
+        if degrees.components is not None and stars:
+            degrees.components.union(next(iter(stars)), person_id)
+        stars.add(person_id)
+        degrees.people[person_id]["movies"].add(movie_id)
+        self.recast.add(movie_id)
+
+    def delete_star(self, row):
+        person_id, movie_id = row["person_id"], row["movie_id"]
+        if person_id not in degrees.people or movie_id not in degrees.movies:
+            return
+        stars = degrees.movies[movie_id]["stars"]
+        if person_id not in stars:
+            return
+        stars.discard(person_id)
+        degrees.people[person_id]["movies"].discard(movie_id)
+        self.split.add(person_id)
+        self.split.update(stars)
+        self.recast.add(movie_id)
+
+    def finish(self):
+        if degrees.components is not None and self.split:
+            degrees.components.split(self.split, co_stars)
+
+        tables = degrees.weight_tables
+        if self.movies_changed:
+            # the age of every movie is relative to the newest one
+            tables.pop("age", None)
+        if "cast" in tables:
+            for movie_id in self.recast:
+                if movie_id in degrees.movies:
+                    tables["cast"][movie_id] = len(degrees.movies[movie_id]["stars"])
+                else:
+                    tables["cast"].pop(movie_id, None)
+
+        # filter masks are compiled over the old set of movies
+        degrees.filter_masks.clear()
+
+        # and the compact copy of the dicts holds the old graph
+        degrees.dict_graph = None
+
+        # landmark distances would no longer be valid bounds, and the
+        # persisted ones are of the files, not of the changed data
+        degrees.oracle = None
+        degrees.changed = True
+
+
+def forget_name(person_id, name):
+    """
+    Removes a person from the names dict, and the name from the
+    name index once nobody has it anymore.
+    """
+    key = name.lower()
+    degrees.names[key].discard(person_id)
+    if not degrees.names[key]:
+        del degrees.names[key]
+        if degrees.name_index is not None:
+            degrees.name_index.remove(key)
+
+
+def co_stars(person_id):
+    for movie_id in degrees.people[person_id]["movies"]:
+        yield from degrees.movies[movie_id]["stars"]
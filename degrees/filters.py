@@ -0,0 +1,61 @@
+"""
+Movie filters for degrees.py
+
+A MovieFilter describes which movies a search may go through, e.g.
+"only movies after 1990". It is compiled once into a mask over the
+movies: a bytearray indexed by movie index for a CompactGraph, a
+frozenset of allowed movie_ids for the dicts. Searches then check the
+mask once per movie they expand, so the graph itself is never copied.
+"""
+
+
+class MovieFilter():
+    """
+    Keeps movies released between `min_year` and `max_year` (inclusive)
+    for which `predicate(movie_id, movie)` is true, `movie` being a dict
+    holding the movie's title and year. Movies without a known year are
+    dropped as soon as a year bound is set.
+
+    Filters with the same bounds and the same predicate function are
+    equal, so they share one compiled mask.
+    """
+    def __init__(self, min_year=None, max_year=None, predicate=None):
+        self.min_year = min_year
+        self.max_year = max_year
+        self.predicate = predicate
+
+    def key(self):
+        return (self.min_year, self.max_year, self.predicate)
+
+    def __eq__(self, other):
+        return isinstance(other, MovieFilter) and self.key() == other.key()
+
+    def __hash__(self):
+        return hash(self.key())
+
+    def allows(self, movie_id, movie):
+        if self.min_year is not None or self.max_year is not None:
+            if not movie["year"].isdigit():
+                return False
+            year = int(movie["year"])
+            if self.min_year is not None and year < self.min_year:
+                return False
+            if self.max_year is not None and year > self.max_year:
+                return False
+        return self.predicate is None or self.predicate(movie_id, movie)
+
+    def compile_dicts(self, movies):
+        """
+        Returns the frozenset of allowed movie_ids of a `movies` dict.
+        """
+        return frozenset(movie_id for movie_id, movie in movies.items() if self.allows(movie_id, movie))
+
+    def compile_graph(self, graph):
+        """
+        Returns a bytearray holding 1 for every allowed movie index of a CompactGraph.
+        """
+        mask = bytearray(graph.movie_count)
+        for m in range(graph.movie_count):
+            movie = {"title": graph.movie_titles[m], "year": graph.movie_years[m]}
+            mask[m] = self.allows(graph.movie_ids[m], movie)
+        return mask
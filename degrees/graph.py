@@ -0,0 +1,551 @@
+"""
+Compact graph backend for degrees.py
+
+People and movies are mapped to dense integer indices and the
+person -> movie and movie -> person edges are stored as CSR
+(compressed sparse row) offset/index arrays. Strings are packed into
+one utf-8 blob per column, so the whole dataset lives in a handful of
+flat arrays instead of millions of small dicts and sets.
+"""
+import csv
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping
+
+from util import Node, PriorityFrontier
+
+# typecode used for every index and offset array, 32 bits is plenty for
+# the full IMDB dump and halves the memory of a 64 bit typecode
+INDEX_TYPE = "i"
+
+
+class StringTable():
+    """
+    Read-only list of strings packed into one utf-8 blob.
+
+    `offsets[i]:offsets[i + 1]` is the byte range of the i-th string.
+    `order` holds the indices sorted by value (by lowercase value if
+    `lowercase` is set), so lookups are a binary search instead of a dict
+    holding every string again.
+    """
+    def __init__(self, data, offsets, order=None, lowercase=False):
+        self.data = data
+        self.offsets = offsets
+        self.order = order
+        self.lowercase = lowercase
+
+    @classmethod
+    def from_strings(cls, strings, sort=False, lowercase=False):
+        encoded = [string.encode("utf-8") for string in strings]
+        offsets = array(INDEX_TYPE, [0])
+        total = 0
+        for chunk in encoded:
+            total += len(chunk)
+            offsets.append(total)
+        order = None
+        if sort:
+            sort_key = (lambda i: strings[i].lower()) if lowercase else strings.__getitem__
+            order = array(INDEX_TYPE, sorted(range(len(strings)), key=sort_key))
+        return cls(b"".join(encoded), offsets, order, lowercase)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return str(self.data[self.offsets[i]:self.offsets[i + 1]], "utf-8")
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def sort_key(self, i):
+        return self[i].lower() if self.lowercase else self[i]
+
+    def find_all(self, value):
+        """
+        Returns the indices of every string equal to `value`.
+        """
+        if self.order is None:
+            raise ValueError("string table is not sorted")
+        position = bisect_left(self.order, value, key=self.sort_key)
+        found = []
+        while position < len(self.order) and self.sort_key(self.order[position]) == value:
+            found.append(self.order[position])
+            position += 1
+        return found
+
+    def find(self, value):
+        """
+        Returns the index of `value`, or None if it isn't in the table.
+        """
+        found = self.find_all(value)
+        return found[0] if found else None
+
+
+class CompactGraph():
+    """
+    Bipartite person/movie graph stored as CSR arrays.
+
+    The movies of person p are
+        person_movies[person_offsets[p]:person_offsets[p + 1]]
+    and the stars of movie m are
+        movie_people[movie_offsets[m]:movie_offsets[m + 1]]
+    """
+    def __init__(self, person_ids, person_names, person_births,
+                 movie_ids, movie_titles, movie_years,
+                 person_offsets, person_movies, movie_offsets, movie_people):
+        self.person_ids = person_ids
+        self.person_names = person_names
+        self.person_births = person_births
+        self.movie_ids = movie_ids
+        self.movie_titles = movie_titles
+        self.movie_years = movie_years
+        self.person_offsets = person_offsets
+        self.person_movies = person_movies
+        self.movie_offsets = movie_offsets
+        self.movie_people = movie_people
+
+    @classmethod
+    def from_csv(cls, directory):
+        """
+        Load the people, movies and stars CSV files of `directory`.
+        """
+        people = ([], [], [])
+        with open(f"{directory}/people.csv", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                people[0].append(row["id"])
+                people[1].append(row["name"])
+                people[2].append(row["birth"])
+
+        movies = ([], [], [])
+        with open(f"{directory}/movies.csv", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                movies[0].append(row["id"])
+                movies[1].append(row["title"])
+                movies[2].append(row["year"])
+
+        # the id -> index dicts only live for the duration of the load
+        person_index = {person_id: i for i, person_id in enumerate(people[0])}
+        movie_index = {movie_id: i for i, movie_id in enumerate(movies[0])}
+        edge_people = array(INDEX_TYPE)
+        edge_movies = array(INDEX_TYPE)
+        with open(f"{directory}/stars.csv", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                # rows pointing to unknown people or movies are skipped,
+                # the same way load_data does
+                p = person_index.get(row["person_id"])
+                m = movie_index.get(row["movie_id"])
+                if p is not None and m is not None:
+                    edge_people.append(p)
+                    edge_movies.append(m)
+
+        return cls.from_edges(people, movies, edge_people, edge_movies)
+
+    @classmethod
+    def from_dicts(cls, people, movies):
+        """
+        Build a compact copy of the `people` and `movies` dicts of degrees.py.
+        """
+        person_ids = list(people)
+        movie_ids = list(movies)
+        movie_index = {movie_id: i for i, movie_id in enumerate(movie_ids)}
+        edge_people = array(INDEX_TYPE)
+        edge_movies = array(INDEX_TYPE)
+        for p, person_id in enumerate(person_ids):
+            for movie_id in people[person_id]["movies"]:
+                edge_people.append(p)
+                edge_movies.append(movie_index[movie_id])
+        return cls.from_edges(
+            (person_ids,
+             [people[person_id]["name"] for person_id in person_ids],
+             [people[person_id]["birth"] for person_id in person_ids]),
+            (movie_ids,
+             [movies[movie_id]["title"] for movie_id in movie_ids],
+             [movies[movie_id]["year"] for movie_id in movie_ids]),
+            edge_people, edge_movies)
+
+    @classmethod
+    def from_edges(cls, people, movies, edge_people, edge_movies):
+        """
+        Build the graph from (ids, names, births) and (ids, titles, years)
+        columns plus one (person index, movie index) pair per edge.
+        """
+        person_ids, person_names, person_births = people
+        movie_ids, movie_titles, movie_years = movies
+
+        person_offsets, person_movies = build_csr(len(person_ids), edge_people, edge_movies)
+        # the movie side is derived from the deduplicated person side,
+        # so the two directions always agree
+        owners = array(INDEX_TYPE, bytes(len(person_movies) * person_movies.itemsize))
+        for p in range(len(person_ids)):
+            for position in range(person_offsets[p], person_offsets[p + 1]):
+                owners[position] = p
+        movie_offsets, movie_people = build_csr(len(movie_ids), person_movies, owners)
+
+        return cls(
+            StringTable.from_strings(person_ids, sort=True),
+            StringTable.from_strings(person_names, sort=True, lowercase=True),
+            StringTable.from_strings(person_births),
+            StringTable.from_strings(movie_ids, sort=True),
+            StringTable.from_strings(movie_titles),
+            StringTable.from_strings(movie_years),
+            person_offsets, person_movies, movie_offsets, movie_people)
+
+    @property
+    def person_count(self):
+        return len(self.person_offsets) - 1
+
+    @property
+    def movie_count(self):
+        return len(self.movie_offsets) - 1
+
+    def person_index(self, person_id):
+        return self.person_ids.find(person_id)
+
+    def movie_index(self, movie_id):
+        return self.movie_ids.find(movie_id)
+
+    def movies_of(self, p):
+        return self.person_movies[self.person_offsets[p]:self.person_offsets[p + 1]]
+
+    def stars_of(self, m):
+        return self.movie_people[self.movie_offsets[m]:self.movie_offsets[m + 1]]
+
+    def breadth_first_path(self, source, target, allowed=None):
+        """
+        Breadth-first search over person indices.
+
+        `allowed` is a bytearray over movie indices, movies
+        marked 0 in it are skipped (see filters.py).
+
+        Returns a list of (movie index, person index) pairs, or None.
+        """
+        if source == target:
+            return []
+        person_offsets, person_movies = self.person_offsets, self.person_movies
+        movie_offsets, movie_people = self.movie_offsets, self.movie_people
+
+        # parent_movie[q] is the movie used to reach q
+        parent_person, parent_movie = self.search_parents(source)
+
+        frontier = [source]
+        while frontier:
+            next_frontier = []
+            for p in frontier:
+                for position in range(person_offsets[p], person_offsets[p + 1]):
+                    m = person_movies[position]
+                    if allowed is not None and not allowed[m]:
+                        continue
+                    for q in movie_people[movie_offsets[m]:movie_offsets[m + 1]]:
+                        if q in parent_person:
+                            continue
+                        parent_person[q] = p
+                        parent_movie[q] = m
+                        if q == target:
+                            return trace_path(target, source, parent_person, parent_movie)
+                        next_frontier.append(q)
+            frontier = next_frontier
+        return None
+
+    def bidirectional_path(self, source, target, allowed=None):
+        """
+        Bidirectional breadth-first search over person indices,
+        see degrees.bidirectional_path.
+        """
+        if source == target:
+            return []
+        forward = self.search_parents(source)
+        backward = self.search_parents(target)
+        forward_frontier = [source]
+        backward_frontier = [target]
+
+        while forward_frontier and backward_frontier:
+            if len(forward_frontier) <= len(backward_frontier):
+                forward_frontier, meeting = self.expand_level(forward_frontier, forward, backward[0], allowed)
+            else:
+                backward_frontier, meeting = self.expand_level(backward_frontier, backward, forward[0], allowed)
+
+            if meeting is not None:
+                path = trace_path(meeting, source, *forward)
+                # the backward parents point towards the target, so they
+                # can be followed from the meeting point as they are
+                state = meeting
+                while state != target:
+                    movie, state = backward[1][state], backward[0][state]
+                    path.append((movie, state))
+                return path
+        return None
+
+    def bipartite_path(self, source, target, allowed=None):
+        """
+        Breadth-first search scanning every movie's cast only once,
+        see degrees.bipartite_path.
+        """
+        if source == target:
+            return []
+        person_offsets, person_movies = self.person_offsets, self.person_movies
+        movie_offsets, movie_people = self.movie_offsets, self.movie_people
+        parent_person, parent_movie = self.search_parents(source)
+        seen_movies = set()
+
+        frontier = [source]
+        while frontier:
+            next_frontier = []
+            for p in frontier:
+                for position in range(person_offsets[p], person_offsets[p + 1]):
+                    m = person_movies[position]
+                    if m in seen_movies or (allowed is not None and not allowed[m]):
+                        continue
+                    seen_movies.add(m)
+                    for q in movie_people[movie_offsets[m]:movie_offsets[m + 1]]:
+                        if q in parent_person:
+                            continue
+                        parent_person[q] = p
+                        parent_movie[q] = m
+                        if q == target:
+                            return trace_path(target, source, parent_person, parent_movie)
+                        next_frontier.append(q)
+            frontier = next_frontier
+        return None
+
+    def weighted_path(self, source, target, weights, heuristic=None, allowed=None):
+        """
+        Dijkstra search (A* with a `heuristic`) over person indices where
+        going through movie m costs the integer `weights[m]`.
+
+        `heuristic(p)` must never overestimate the remaining cost from
+        person index p to the target. It doesn't have to be consistent:
+        a person reached more cheaply after being expanded is expanded
+        again. Returns the (movie index, person index) steps of the
+        cheapest path, or None.
+        """
+        if source == target:
+            return []
+        parent_person, parent_movie = self.search_parents(source)
+        cost = {source: 0}
+
+        frontier = PriorityFrontier()
+        frontier.add(Node(state=source, parent=None, action=None), 0)
+        while not frontier.empty():
+            node = frontier.remove()
+            p = node.state
+            if p == target:
+                return trace_path(target, source, parent_person, parent_movie)
+
+            for m in self.movies_of(p):
+                if allowed is not None and not allowed[m]:
+                    continue
+                # the weight is looked up once per movie, not once per star
+                g = cost[p] + weights[m]
+                for q in self.stars_of(m):
+                    if cost.get(q, g + 1) <= g:
+                        continue
+                    cost[q] = g
+                    parent_person[q] = p
+                    parent_movie[q] = m
+                    frontier.add(Node(state=q, parent=None, action=m),
+                                 g if heuristic is None else g + heuristic(q))
+        return None
+
+    def single_source(self, source):
+        """
+        Breadth-first search from `source` over the whole component.
+
+        Returns (distance, parent_person, parent_movie) arrays indexed by
+        person, distance is -1 for people that can't be reached.
+        """
+        movie_offsets, movie_people = self.movie_offsets, self.movie_people
+        # this search covers the whole component, so arrays over all
+        # people are cheaper than dicts
+        parent_person = array(INDEX_TYPE, [-1]) * self.person_count
+        parent_movie = array(INDEX_TYPE, [-1]) * self.person_count
+        parent_person[source] = source
+        distance = array(INDEX_TYPE, [-1]) * self.person_count
+        distance[source] = 0
+        seen_movies = bytearray(self.movie_count)
+
+        frontier = [source]
+        level = 0
+        while frontier:
+            level += 1
+            next_frontier = []
+            for p in frontier:
+                for m in self.movies_of(p):
+                    if seen_movies[m]:
+                        continue
+                    seen_movies[m] = 1
+                    for q in movie_people[movie_offsets[m]:movie_offsets[m + 1]]:
+                        if distance[q] != -1:
+                            continue
+                        distance[q] = level
+                        parent_person[q] = p
+                        parent_movie[q] = m
+                        next_frontier.append(q)
+            frontier = next_frontier
+        return distance, parent_person, parent_movie
+
+    def search_parents(self, root):
+        """
+        Returns fresh (parent_person, parent_movie) dicts for a search
+        starting at `root`, keyed by the people seen so far.
+
+        Dicts instead of arrays over all people keep a search that stops
+        early as cheap as the part of the graph it actually explored.
+        """
+        return {root: root}, {}
+
+    def expand_level(self, frontier, parents, other_parents, allowed=None):
+        """
+        Expands one breadth-first level, see degrees.expand_level.
+        """
+        parent_person, parent_movie = parents
+        next_frontier = []
+        for p in frontier:
+            for m in self.movies_of(p):
+                if allowed is not None and not allowed[m]:
+                    continue
+                for q in self.stars_of(m):
+                    if q in parent_person:
+                        continue
+                    parent_person[q] = p
+                    parent_movie[q] = m
+                    if q in other_parents:
+                        return next_frontier, q
+                    next_frontier.append(q)
+        return next_frontier, None
+
+
+def build_csr(rows, edge_rows, edge_columns):
+    """
+    Group (row, column) edges by row with a counting sort.
+
+    Returns (offsets, columns), duplicate edges are dropped.
+    """
+    counts = array(INDEX_TYPE, bytes(rows * array(INDEX_TYPE).itemsize))
+    for row in edge_rows:
+        counts[row] += 1
+    offsets = array(INDEX_TYPE, [0])
+    total = 0
+    for count in counts:
+        total += count
+        offsets.append(total)
+
+    # scatter every column into its row's segment
+    columns = array(INDEX_TYPE, bytes(total * array(INDEX_TYPE).itemsize))
+    fill = array(INDEX_TYPE, offsets[:-1])
+    for row, column in zip(edge_rows, edge_columns):
+        columns[fill[row]] = column
+        fill[row] += 1
+
+    # drop duplicates inside every segment, the same edge can appear
+    # more than once in stars.csv
+    deduplicated = array(INDEX_TYPE)
+    unique_offsets = array(INDEX_TYPE, [0])
+    for row in range(rows):
+        segment = columns[offsets[row]:offsets[row + 1]]
+        if len(segment) > 1:
+            segment = sorted(set(segment))
+        deduplicated.extend(segment)
+        unique_offsets.append(len(deduplicated))
+    return unique_offsets, deduplicated
+
+
+def trace_path(state, root, parent_person, parent_movie):
+    """
+    Follow parent arrays from `state` back to `root`.
+
+    Returns the (movie index, person index) steps from the root to `state`.
+    """
+    path = []
+    while state != root:
+        path.append((parent_movie[state], state))
+        state = parent_person[state]
+    path.reverse()
+    return path
+
+
+class PeopleView(Mapping):
+    """
+    Read-only view of a CompactGraph shaped like the `people` dict
+    of degrees.py, the inner dicts are built on every access.
+    """
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __getitem__(self, person_id):
+        p = self.graph.person_index(person_id)
+        if p is None:
+            raise KeyError(person_id)
+        return {
+            "name": self.graph.person_names[p],
+            "birth": self.graph.person_births[p],
+            "movies": {self.graph.movie_ids[m] for m in self.graph.movies_of(p)},
+        }
+
+    def __contains__(self, person_id):
+        return self.graph.person_index(person_id) is not None
+
+    def __iter__(self):
+        return iter(self.graph.person_ids)
+
+    def __len__(self):
+        return self.graph.person_count
+
+
+class MoviesView(Mapping):
+    """
+    Read-only view of a CompactGraph shaped like the `movies` dict
+    of degrees.py.
+    """
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __getitem__(self, movie_id):
+        m = self.graph.movie_index(movie_id)
+        if m is None:
+            raise KeyError(movie_id)
+        return {
+            "title": self.graph.movie_titles[m],
+            "year": self.graph.movie_years[m],
+            "stars": {self.graph.person_ids[p] for p in self.graph.stars_of(m)},
+        }
+
+    def __contains__(self, movie_id):
+        return self.graph.movie_index(movie_id) is not None
+
+    def __iter__(self):
+        return iter(self.graph.movie_ids)
+
+    def __len__(self):
+        return self.graph.movie_count
+
+
+class NamesView(Mapping):
+    """
+    Read-only view of a CompactGraph shaped like the `names` dict
+    of degrees.py, mapping lowercase names to sets of person_ids.
+    """
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __getitem__(self, name):
+        found = self.graph.person_names.find_all(name)
+        if not found:
+            raise KeyError(name)
+        return {self.graph.person_ids[p] for p in found}
+
+    def __contains__(self, name):
+        return bool(self.graph.person_names.find_all(name))
+
+    def __iter__(self):
+        # names are sorted by their lowercase form, so equal names
+        # sit next to each other
+        previous = None
+        for p in self.graph.person_names.order:
+            name = self.graph.person_names[p].lower()
+            if name != previous:
+                yield name
+                previous = name
+
+    def __len__(self):
+        return sum(1 for _ in self)
@@ -0,0 +1,216 @@
+"""
+Landmark distance oracle for degrees.py
+
+A handful of well connected "landmark" people get a full breadth-first
+search each, and their distances to everybody are kept. For any two
+people s and t and any landmark L the triangle inequality gives
+
+    |d(L, s) - d(L, t)| <= d(s, t) <= d(L, s) + d(L, t)
+
+so bounds on the degrees of separation cost one lookup per landmark.
+The lower bound is also a consistent heuristic for an A* search
+(ALT: A*, landmarks, triangle inequality), which finds exact shortest
+paths while expanding far fewer people than a blind search.
+"""
+import json
+import math
+import os
+from array import array
+
+from graph import INDEX_TYPE, trace_path
+from snapshot import source_stats
+from util import Node, PriorityFrontier
+
+LANDMARKS_NAME = "degrees.landmarks"
+
+VERSION = 1
+
+
+class LandmarkOracle():
+    """
+    Distances from every landmark to every person of a CompactGraph.
+
+    `distances[i][p]` is the distance from landmark `landmarks[i]` to
+    person index p, or -1 if p can't be reached from it.
+    """
+    def __init__(self, graph, landmarks, distances):
+        self.graph = graph
+        self.landmarks = landmarks
+        self.distances = distances
+
+    @classmethod
+    def build(cls, graph, count=16, landmarks=None):
+        """
+        Runs one search per landmark. Unless `landmarks` (person indices)
+        are given, the `count` people with the most co-star slots are used.
+        """
+        if landmarks is None:
+            landmarks = most_connected(graph, count)
+        distances = [graph.single_source(landmark)[0] for landmark in landmarks]
+        return cls(graph, list(landmarks), distances)
+
+    def save(self, path, sources=None):
+        """
+        Writes the landmarks to `path`: one JSON header line followed by
+        the raw distance arrays.
+        """
+        header = {
+            "version": VERSION,
+            "typecode": INDEX_TYPE,
+            "person_count": self.graph.person_count,
+            "landmarks": [self.graph.person_ids[landmark] for landmark in self.landmarks],
+            "sources": sources,
+        }
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(json.dumps(header).encode("utf-8") + b"\n")
+            for distance in self.distances:
+                f.write(memoryview(distance).cast("B"))
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path, graph, sources=None):
+        """
+        Reads landmarks written by `save`.
+
+        Returns None if the file is missing, from another version, or was
+        computed for another graph.
+        """
+        try:
+            with open(path, "rb") as f:
+                header = json.loads(f.readline())
+                if (header.get("version") != VERSION
+                        or header.get("typecode") != INDEX_TYPE
+                        or header.get("person_count") != graph.person_count
+                        or header.get("sources") != sources):
+                    return None
+                distances = []
+                for _ in header["landmarks"]:
+                    distance = array(INDEX_TYPE)
+                    distance.fromfile(f, graph.person_count)
+                    distances.append(distance)
+        except (OSError, ValueError, EOFError):
+            return None
+        landmarks = [graph.person_index(person_id) for person_id in header["landmarks"]]
+        return cls(graph, landmarks, distances)
+
+    def bounds(self, source, target):
+        """
+        Returns (lower, upper) bounds on the distance between two person
+        indices. Both are math.inf if some landmark proves they aren't
+        connected, upper is math.inf if no landmark reaches both.
+        """
+        if source == target:
+            return 0, 0
+        lower, upper = 0, math.inf
+        for distance in self.distances:
+            d_source, d_target = distance[source], distance[target]
+            if d_source == -1 and d_target == -1:
+                continue
+            if d_source == -1 or d_target == -1:
+                # exactly one of them is in this landmark's component
+                return math.inf, math.inf
+            lower = max(lower, abs(d_source - d_target))
+            upper = min(upper, d_source + d_target)
+        return lower, upper
+
+    def heuristic(self, target):
+        """
+        Returns a function giving the landmark lower bound from any
+        person index to `target`.
+        """
+        pairs = [(distance, distance[target]) for distance in self.distances
+                 if distance[target] != -1]
+
+        def lower_bound(p):
+            best = 0
+            for distance, d_target in pairs:
+                d = distance[p] - d_target
+                if d < 0:
+                    d = -d
+                if d > best:
+                    best = d
+            return best
+        return lower_bound
+
+    def shortest_path(self, source, target, allowed=None):
+        """
+        A* search between two person indices guided by the landmark
+        lower bounds, returns (movie index, person index) steps or None.
+
+        `allowed` is a bytearray over movie indices, movies marked 0 in it
+        are skipped. Filtering only makes paths longer, so the lower bounds
+        stay valid, but the upper bound no longer holds and isn't used.
+        """
+        lower, upper = self.bounds(source, target)
+        if lower == math.inf:
+            return None
+        if source == target:
+            return []
+        if allowed is not None:
+            upper = math.inf
+
+        graph = self.graph
+        h = self.heuristic(target)
+        parent_person, parent_movie = graph.search_parents(source)
+        cost = {source: 0}
+        closed = set()
+
+        frontier = PriorityFrontier()
+        frontier.add(Node(state=source, parent=None, action=None), h(source))
+        while not frontier.empty():
+            node = frontier.remove()
+            p = node.state
+            if p == target:
+                return trace_path(target, source, parent_person, parent_movie)
+            closed.add(p)
+
+            g = cost[p] + 1
+            for m in graph.movies_of(p):
+                if allowed is not None and not allowed[m]:
+                    continue
+                for q in graph.stars_of(m):
+                    if q in closed or cost.get(q, g + 1) <= g:
+                        continue
+                    estimate = g + h(q)
+                    # nothing estimated beyond the landmark upper
+                    # bound can be on a shortest path
+                    if estimate > upper:
+                        continue
+                    cost[q] = g
+                    parent_person[q] = p
+                    parent_movie[q] = m
+                    frontier.add(Node(state=q, parent=None, action=m), estimate)
+        return None
+
+
+def most_connected(graph, count):
+    """
+    Returns the `count` person indices with the most co-star slots,
+    the sum of the cast sizes of all their movies.
+    """
+    def slots(p):
+        return sum(graph.movie_offsets[m + 1] - graph.movie_offsets[m] for m in graph.movies_of(p))
+    return sorted(range(graph.person_count), key=slots, reverse=True)[:count]
+
+
+def landmarks_path(directory):
+    return os.path.join(directory, LANDMARKS_NAME)
+
+
+def load_or_build(graph, directory, count=16):
+    """
+    Returns the landmarks persisted next to the CSV files of `directory`,
+    computing and saving them first if they are missing or stale.
+    """
+    sources = source_stats(directory)
+    oracle = LandmarkOracle.load(landmarks_path(directory), graph, sources)
+    if oracle is not None and len(oracle.landmarks) == count:
+        return oracle
+
+    oracle = LandmarkOracle.build(graph, count)
+    try:
+        oracle.save(landmarks_path(directory), sources)
+    except OSError:
+        pass
+    return oracle
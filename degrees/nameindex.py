@@ -0,0 +1,224 @@
+"""
+Name search for degrees.py
+
+NameIndex answers prefix and fuzzy lookups over the lowercase names of
+the `names` mapping. Prefixes are found by binary search over the sorted
+names, which walks the same paths as a prefix trie but without one dict
+per character. The sorted names are kept in blocks (SortedKeys), so a
+name added or removed by a delta only shifts the names of its block.
+Fuzzy lookups use an inverted index from character
+trigrams to names and rank candidates by their trigram overlap.
+
+The resolve_* functions pick one person out of several with the same
+name without asking on stdin, so batch jobs can resolve names too.
+"""
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+
+from graph import INDEX_TYPE
+
+# candidates sharing fewer trigrams than this fraction of the query's
+# are not worth scoring
+MIN_OVERLAP = 0.3
+
+# names per block of SortedKeys, blocks are split at twice this
+BLOCK = 512
+
+
+class NameIndex():
+    def __init__(self, names):
+        """
+        Indexes every key of `names`, the lowercase name -> person_ids
+        mapping of degrees.py (a dict or a NamesView).
+        """
+        self.names = names
+        # append-only list of every name ever indexed, the trigram postings
+        # point into it so that they never have to be renumbered
+        self.entries = sorted(names)
+        # sorted names for prefix lookups, kept sorted as names come and go
+        self.keys = SortedKeys(self.entries)
+        self.entry_of = {key: i for i, key in enumerate(self.entries)}
+        postings = {}
+        for i, key in enumerate(self.entries):
+            for gram in trigrams(key):
+                postings.setdefault(gram, array(INDEX_TYPE)).append(i)
+        self.postings = postings
+
+    def add(self, key):
+        """
+        Indexes a new lowercase name.
+        """
+        if key in self.entry_of:
+            return
+        self.keys.add(key)
+        self.entry_of[key] = len(self.entries)
+        for gram in trigrams(key):
+            self.postings.setdefault(gram, array(INDEX_TYPE)).append(len(self.entries))
+        self.entries.append(key)
+
+    def remove(self, key):
+        """
+        Drops a lowercase name, its postings are left behind as
+        tombstones that fuzzy lookups skip.
+        """
+        i = self.entry_of.pop(key, None)
+        if i is None:
+            return
+        self.entries[i] = None
+        self.keys.remove(key)
+
+    def prefix(self, prefix, limit=10):
+        """
+        Returns up to `limit` names starting with `prefix`, in sorted order.
+        """
+        prefix = prefix.lower()
+        found = []
+        for key in self.keys.starting_at(prefix):
+            if len(found) == limit or not key.startswith(prefix):
+                break
+            found.append(key)
+        return found
+
+    def fuzzy(self, name, limit=10):
+        """
+        Returns up to `limit` (score, name) pairs for the names most similar
+        to `name`, best first. Scores are Dice coefficients over trigrams.
+        """
+        grams = trigrams(name.lower())
+        if not grams:
+            return []
+        hits = Counter()
+        for gram in grams:
+            hits.update(self.postings.get(gram, ()))
+
+        needed = MIN_OVERLAP * len(grams)
+        scored = []
+        for i, shared in hits.items():
+            key = self.entries[i]
+            if shared < needed or key is None:
+                continue
+            scored.append((2 * shared / (len(grams) + len(trigrams(key))), key))
+        scored.sort(key=lambda pair: (-pair[0], pair[1]))
+        return scored[:limit]
+
+    def search(self, name, limit=10):
+        """
+        Returns the person_ids of the exact name if there is one,
+        otherwise of the closest fuzzy match (or an empty set).
+        """
+        name = name.lower()
+        if name in self.names:
+            return set(self.names[name])
+        found = self.fuzzy(name, limit=1)
+        return set(self.names[found[0][1]]) if found else set()
+
+
+class SortedKeys():
+    """
+    Sorted strings split into blocks of up to 2 * BLOCK. Adding or
+    removing one is a binary search over the last key of every block
+    and an insert into one block, instead of shifting a list of all of
+    them.
+    """
+    def __init__(self, keys):
+        """
+        `keys` have to be sorted already.
+        """
+        self.blocks = [keys[i:i + BLOCK] for i in range(0, len(keys), BLOCK)]
+        self.maxes = [block[-1] for block in self.blocks]
+
+    def __len__(self):
+        return sum(len(block) for block in self.blocks)
+
+    def __iter__(self):
+        for block in self.blocks:
+            yield from block
+
+    def add(self, key):
+        if not self.blocks:
+            self.blocks.append([key])
+            self.maxes.append(key)
+            return
+        # keys beyond the last block go into it
+        b = min(bisect_left(self.maxes, key), len(self.blocks) - 1)
+        block = self.blocks[b]
+        insort(block, key)
+        self.maxes[b] = block[-1]
+        if len(block) > 2 * BLOCK:
+            self.blocks[b:b + 1] = [block[:BLOCK], block[BLOCK:]]
+            self.maxes[b:b + 1] = [block[BLOCK - 1], block[-1]]
+
+    def remove(self, key):
+        b = bisect_left(self.maxes, key)
+        if b == len(self.blocks):
+            return
+        block = self.blocks[b]
+        i = bisect_left(block, key)
+        if block[i] != key:
+            return
+        del block[i]
+        if block:
+            self.maxes[b] = block[-1]
+        else:
+            del self.blocks[b]
+            del self.maxes[b]
+
+    def starting_at(self, key):
+        """
+        Yields the keys from the first one not below `key` on, in order.
+        """
+        b = bisect_left(self.maxes, key)
+        if b == len(self.blocks):
+            return
+        block = self.blocks[b]
+        for i in range(bisect_left(block, key), len(block)):
+            yield block[i]
+        for block in self.blocks[b + 1:]:
+            yield from block
+
+
+def trigrams(text):
+    """
+    Returns the set of character trigrams of `text`, padded so that the
+    start and end of the text count as well.
+    """
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def resolve_most_films(person_ids, people, birth_year=None):
+    """
+    Picks the person who starred in the most movies.
+    """
+    return max(sorted(person_ids), key=lambda person_id: len(people[person_id]["movies"]))
+
+
+def resolve_birth_year(person_ids, people, birth_year=None):
+    """
+    Picks the person born closest to `birth_year`, people without a known
+    birth year come last. Ties go to the person with the most movies.
+    """
+    if birth_year is None:
+        raise ValueError("the birth_year strategy needs a birth_year hint")
+
+    def distance(person_id):
+        birth = people[person_id]["birth"]
+        gap = abs(int(birth) - int(birth_year)) if birth.isdigit() else float("inf")
+        return gap, -len(people[person_id]["movies"])
+    return min(sorted(person_ids), key=distance)
+
+
+def resolve_all(person_ids, people, birth_year=None):
+    """
+    Returns every candidate instead of picking one.
+    """
+    return sorted(person_ids)
+
+
+# Ways person_id_for_name can settle an ambiguous name without asking
+STRATEGIES = {
+    "most_films": resolve_most_films,
+    "birth_year": resolve_birth_year,
+    "all": resolve_all,
+}
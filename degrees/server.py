@@ -0,0 +1,215 @@
+"""
+Long running degrees server
+
+Loads the data once and answers queries over a small HTTP interface:
+
+    GET /person?name=Tom Hanks
+    GET /path?source=Emma Watson&target=Jennifer Lawrence[&mode=bipartite]
+    GET /metrics
+
+Every answer is a JSON object carrying the request's latency in
+milliseconds. Searches run in a process pool so a slow 8-degree query
+never blocks name lookups or other searches, /metrics reports latency
+statistics per endpoint.
+
+All modes of degrees.SEARCH_MODES can be asked for, the landmarks "alt"
+searches need are loaded at startup (computed and saved on the first run).
+
+Usage: python server.py [directory] [port]
+"""
+import asyncio
+import json
+import multiprocessing
+import sys
+import time
+import traceback
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import degrees
+
+# how many recent latencies per endpoint the percentiles are computed from
+LATENCY_WINDOW = 1000
+
+
+class Metrics():
+    """
+    Request counts and latencies per endpoint.
+    """
+    def __init__(self):
+        self.endpoints = {}
+
+    def record(self, endpoint, seconds, status):
+        stats = self.endpoints.setdefault(endpoint, {
+            "count": 0,
+            "errors": 0,
+            "total": 0.0,
+            "max": 0.0,
+            "recent": deque(maxlen=LATENCY_WINDOW),
+        })
+        stats["count"] += 1
+        stats["errors"] += status >= 400
+        stats["total"] += seconds
+        stats["max"] = max(stats["max"], seconds)
+        stats["recent"].append(seconds)
+
+    def report(self):
+        report = {}
+        for endpoint, stats in self.endpoints.items():
+            recent = sorted(stats["recent"])
+            report[endpoint] = {
+                "count": stats["count"],
+                "errors": stats["errors"],
+                "mean_ms": 1000 * stats["total"] / stats["count"],
+                "max_ms": 1000 * stats["max"],
+                "p50_ms": 1000 * percentile(recent, 0.5),
+                "p95_ms": 1000 * percentile(recent, 0.95),
+                "p99_ms": 1000 * percentile(recent, 0.99),
+            }
+        return report
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def search(source, target, mode):
+    """
+    Runs in a pool worker, which inherited the loaded data when it was forked.
+    """
+    return degrees.shortest_path(source, target, mode)
+
+
+class DegreesServer():
+    def __init__(self, pool):
+        self.pool = pool
+        self.metrics = Metrics()
+
+    async def handle(self, reader, writer):
+        """
+        Answers a single HTTP request and closes the connection.
+        """
+        started = time.perf_counter()
+        endpoint = "invalid"
+        try:
+            request_line = await reader.readline()
+            # skip the headers, nothing in them matters to us
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            method, target, _ = request_line.decode("latin-1").split(" ", 2)
+            url = urlsplit(target)
+            endpoint = url.path
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            if method != "GET":
+                status, body = 405, {"error": "only GET is supported"}
+            else:
+                status, body = await self.dispatch(endpoint, query)
+        except ValueError as error:
+            status, body = 400, {"error": str(error)}
+        except Exception as error:
+            # a bug or a broken worker pool, the client still gets an
+            # answer and the request still shows up in the metrics
+            traceback.print_exc()
+            status, body = 500, {"error": f"{type(error).__name__}: {error}"}
+
+        elapsed = time.perf_counter() - started
+        if endpoint not in ("/person", "/path", "/metrics"):
+            endpoint = "invalid"
+        self.metrics.record(endpoint, elapsed, status)
+        body["latency_ms"] = 1000 * elapsed
+
+        payload = json.dumps(body).encode("utf-8")
+        writer.write(
+            f"HTTP/1.0 {status} {'OK' if status == 200 else 'Error'}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\n\r\n".encode("latin-1") + payload)
+        await writer.drain()
+        writer.close()
+
+    async def dispatch(self, endpoint, query):
+        if endpoint == "/person":
+            return 200, {"people": self.lookup(query.get("name", ""))}
+        if endpoint == "/path":
+            return await self.path(query)
+        if endpoint == "/metrics":
+            return 200, {"endpoints": self.metrics.report()}
+        return 404, {"error": f"unknown endpoint {endpoint}"}
+
+    def lookup(self, name):
+        """
+        Returns every person with this name, ambiguous names are
+        answered with all of their candidates instead of prompting.
+        """
+        found = []
+        for person_id in sorted(degrees.names.get(name.lower(), set())):
+            person = degrees.people[person_id]
+            found.append({"id": person_id, "name": person["name"], "birth": person["birth"]})
+        return found
+
+    async def path(self, query):
+        ends = []
+        for key in ("source", "target"):
+            candidates = self.lookup(query.get(key, ""))
+            if len(candidates) != 1:
+                # ids are accepted as well, which is how clients resolve
+                # an ambiguous name after looking it up
+                if query.get(key) in degrees.people:
+                    ends.append(query[key])
+                    continue
+                status = 409 if candidates else 404
+                return status, {"error": f"{key} not found or ambiguous", "candidates": candidates}
+            ends.append(candidates[0]["id"])
+
+        mode = query.get("mode", "bidirectional")
+        if mode not in degrees.SEARCH_MODES:
+            raise ValueError(f"unknown search mode: {mode}")
+        loop = asyncio.get_running_loop()
+        path = await loop.run_in_executor(self.pool, search, ends[0], ends[1], mode)
+        if path is None:
+            return 200, {"degrees": None, "path": None}
+        return 200, {"degrees": len(path), "path": [
+            {"movie": degrees.movies[movie_id]["title"], "person": degrees.people[person_id]["name"]}
+            for movie_id, person_id in path
+        ]}
+
+
+def start_workers(pool):
+    """
+    Forks every worker of a fork based `pool` right away. Forked on the
+    first search instead, they would inherit the connections open at that
+    moment and keep them open after the server closed its side.
+    """
+    pool.submit(abs, 0).result()
+
+
+async def serve(port, workers=None):
+    # the pool is forked after the data is loaded, so every worker
+    # starts with the graph already in memory
+    context = multiprocessing.get_context("fork")
+    with ProcessPoolExecutor(workers, mp_context=context) as pool:
+        start_workers(pool)
+        server = DegreesServer(pool)
+        listener = await asyncio.start_server(server.handle, "127.0.0.1", port)
+        print(f"Serving on http://127.0.0.1:{port}")
+        async with listener:
+            await listener.serve_forever()
+
+
+def main():
+    if len(sys.argv) > 3:
+        sys.exit("Usage: python server.py [directory] [port]")
+    directory = sys.argv[1] if len(sys.argv) >= 2 else "large"
+    port = int(sys.argv[2]) if len(sys.argv) == 3 else 8050
+
+    print("Loading data...")
+    degrees.load_data(directory, snapshot=True, index_components=True)
+    degrees.load_landmarks(directory)
+    print("Data loaded.")
+    asyncio.run(serve(port))
+
+
+if __name__ == "__main__":
+    main()
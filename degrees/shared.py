@@ -0,0 +1,155 @@
+"""
+Shared-memory CompactGraph for multi-process workers
+
+SharedGraph copies every array of a CompactGraph into one
+multiprocessing.shared_memory block, laid out exactly like a snapshot
+(see snapshot.py). Workers attach to the block by name and get a
+CompactGraph of memoryviews over it, so however many workers there are
+the graph is in memory once, and nothing is pickled or parsed.
+
+    with SharedGraph.create(graph) as shared:      # in the parent
+        ... start workers with shared.name ...
+    # the block is released and unlinked here
+
+    shared = SharedGraph.attach(name)               # in a worker
+    shared.graph.bidirectional_path(source, target)
+    shared.close()
+
+A snapshot file next to the CSV files works the same way without this
+module: every process that maps it shares the operating system's pages.
+"""
+import multiprocessing
+import os
+from contextlib import contextmanager
+from multiprocessing import resource_tracker, shared_memory
+
+from snapshot import graph_from_buffer, layout, read_header, write_graph
+
+
+class SharedGraph():
+    def __init__(self, memory, owner):
+        self.memory = memory
+        self.owner = owner
+        self.views = []
+        self.graph = graph_from_buffer(memory.buf, read_header(memory.buf), self.views)
+
+    @property
+    def name(self):
+        return self.memory.name
+
+    @classmethod
+    def create(cls, graph):
+        """
+        Copies `graph` into a new shared memory block. The creating
+        process owns the block and unlinks it when closing.
+        """
+        header, placed, size = layout(graph)
+        memory = shared_memory.SharedMemory(create=True, size=size)
+        try:
+            write_graph(memory.buf, header, placed)
+        except BaseException:
+            memory.close()
+            memory.unlink()
+            raise
+        return cls(memory, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        """
+        Attaches to the block created under `name` by SharedGraph.create.
+        """
+        try:
+            memory = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # before Python 3.13 attaching registers the block with the
+            # resource tracker, which unlinks it when this process exits,
+            # only the creator should do that. Unregistering afterwards
+            # isn't enough: spawned workers share the creator's tracker
+            # and would take away its registration, so skip registering
+            register = resource_tracker.register
+            resource_tracker.register = lambda name, rtype: None
+            try:
+                memory = shared_memory.SharedMemory(name=name)
+            finally:
+                resource_tracker.register = register
+        return cls(memory, owner=False)
+
+    def close(self):
+        """
+        Releases this process's view of the block, the graph can't be
+        used anymore afterwards. The owner also unlinks the block.
+        """
+        if self.memory is None:
+            return
+        self.graph = None
+        # every memoryview over the block has to be released before it
+        # can be closed, the last one is the view they were all cut from
+        for view in reversed(self.views):
+            view.release()
+        self.views = []
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+        self.memory = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# CompactGraph of the current pool worker, see graph_pool
+worker_graph = None
+
+# SharedGraph a spawned worker attached to, kept open for its lifetime
+worker_block = None
+
+
+@contextmanager
+def graph_pool(graph, processes=None, shared=False):
+    """
+    Yields a process pool whose workers find `graph` in worker_graph.
+
+    Where fork is available the workers simply inherit the graph
+    copy-on-write. Otherwise, or with `shared`, the graph is put into a
+    SharedGraph that spawned workers attach to, and which is released
+    again once the pool is done.
+    """
+    global worker_graph
+    processes = processes or os.cpu_count()
+    if not shared and "fork" in multiprocessing.get_all_start_methods():
+        worker_graph = graph
+        try:
+            with multiprocessing.get_context("fork").Pool(processes) as pool:
+                yield pool
+        finally:
+            worker_graph = None
+    else:
+        with SharedGraph.create(graph) as block:
+            context = multiprocessing.get_context("spawn")
+            with context.Pool(processes, initializer=attach_worker, initargs=(block.name,)) as pool:
+                yield pool
+
+
+@contextmanager
+def in_process(graph):
+    """
+    Makes `graph` the worker_graph of this process, for running
+    worker functions without a pool.
+    """
+    global worker_graph
+    worker_graph = graph
+    try:
+        yield
+    finally:
+        worker_graph = None
+
+
+def attach_worker(name):
+    """
+    Pool initializer of spawned workers.
+    """
+    global worker_block, worker_graph
+    worker_block = SharedGraph.attach(name)
+    worker_graph = worker_block.graph
@@ -0,0 +1,212 @@
+"""
+Binary snapshots of a CompactGraph
+
+A snapshot is a small JSON header followed by the raw bytes of every
+array of the graph, each aligned to 8 bytes. Loading one memory maps the
+file and casts memoryviews over it, so nothing is parsed or copied and
+the pages are only read from disk when a search touches them.
+
+Layout:
+    MAGIC | header length (uint32, little endian) | JSON header | arrays
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+
+from graph import CompactGraph, StringTable
+
+MAGIC = b"DEGSNAP\0"
+
+# bump whenever the layout or the set of arrays changes,
+# older snapshots are then rebuilt from the CSV files
+VERSION = 1
+
+SNAPSHOT_NAME = "degrees.snapshot"
+
+SOURCE_FILES = ("people.csv", "movies.csv", "stars.csv")
+
+ALIGNMENT = 8
+
+STRING_COLUMNS = ("person_ids", "person_names", "person_births",
+                  "movie_ids", "movie_titles", "movie_years")
+
+INDEX_COLUMNS = ("person_offsets", "person_movies", "movie_offsets", "movie_people")
+
+
+def snapshot_path(directory):
+    return os.path.join(directory, SNAPSHOT_NAME)
+
+
+def source_stats(directory):
+    """
+    Returns the size and modification time of every CSV file,
+    a snapshot is only used if these still match.
+    """
+    stats = {}
+    for filename in SOURCE_FILES:
+        stat = os.stat(os.path.join(directory, filename))
+        stats[filename] = [stat.st_size, stat.st_mtime_ns]
+    return stats
+
+
+def graph_arrays(graph):
+    """
+    Returns a list of (name, buffer) pairs holding every array of the graph.
+    """
+    arrays = []
+    for column in STRING_COLUMNS:
+        table = getattr(graph, column)
+        arrays.append((f"{column}.data", table.data))
+        arrays.append((f"{column}.offsets", table.offsets))
+        if table.order is not None:
+            arrays.append((f"{column}.order", table.order))
+    for column in INDEX_COLUMNS:
+        arrays.append((column, getattr(graph, column)))
+    return arrays
+
+
+def layout(graph, extra=None):
+    """
+    Works out where every array of the graph goes.
+
+    Returns (header bytes, [(offset, buffer)], total size).
+    """
+    arrays = graph_arrays(graph)
+    header = {
+        "version": VERSION,
+        "byteorder": sys.byteorder,
+        "lowercase": [column for column in STRING_COLUMNS if getattr(graph, column).lowercase],
+        "arrays": {},
+    }
+    header.update(extra or {})
+
+    # the header stores the offsets of the arrays, which depend on the
+    # size of the header itself, so reserve room for the largest offsets
+    # first and fill in the real ones once they are known
+    for name, buffer in arrays:
+        view = memoryview(buffer)
+        header["arrays"][name] = [view.format, 2 ** 63, len(view)]
+    reserved = len(json.dumps(header).encode("utf-8"))
+
+    position = align(len(MAGIC) + 4 + reserved)
+    placed = []
+    for name, buffer in arrays:
+        view = memoryview(buffer)
+        header["arrays"][name][1] = position
+        placed.append((position, view))
+        position = align(position + view.nbytes)
+
+    encoded = json.dumps(header).encode("utf-8")
+    encoded += b" " * (reserved - len(encoded))
+    return MAGIC + struct.pack("<I", len(encoded)) + encoded, placed, position
+
+
+def write_graph(buffer, header, placed):
+    """
+    Copies a graph laid out by `layout` into a writable buffer.
+    """
+    buffer[:len(header)] = header
+    for position, view in placed:
+        buffer[position:position + view.nbytes] = view.cast("B")
+
+
+def read_header(buffer):
+    """
+    Returns the JSON header of a snapshot, or None if the buffer
+    doesn't hold a snapshot this version can read.
+    """
+    if bytes(buffer[:len(MAGIC)]) != MAGIC:
+        return None
+    (length,) = struct.unpack("<I", buffer[len(MAGIC):len(MAGIC) + 4])
+    start = len(MAGIC) + 4
+    header = json.loads(bytes(buffer[start:start + length]))
+    if header.get("version") != VERSION or header.get("byteorder") != sys.byteorder:
+        return None
+    return header
+
+
+def graph_from_buffer(buffer, header, views=None):
+    """
+    Builds a CompactGraph whose arrays are memoryviews over `buffer`.
+
+    Every memoryview created is appended to `views` if given, so that
+    the owner of the buffer can release them before closing it.
+    """
+    view = memoryview(buffer)
+    arrays = {}
+    for name, (typecode, position, length) in header["arrays"].items():
+        size = struct.calcsize(typecode)
+        arrays[name] = view[position:position + length * size].cast(typecode)
+    if views is not None:
+        views.append(view)
+        views.extend(arrays.values())
+
+    columns = {}
+    for column in STRING_COLUMNS:
+        columns[column] = StringTable(
+            arrays[f"{column}.data"], arrays[f"{column}.offsets"],
+            arrays.get(f"{column}.order"), column in header["lowercase"])
+    for column in INDEX_COLUMNS:
+        columns[column] = arrays[column]
+    return CompactGraph(**columns)
+
+
+def save_snapshot(graph, directory):
+    """
+    Writes a snapshot of `graph` next to the CSV files of `directory`.
+    """
+    header, placed, size = layout(graph, {"sources": source_stats(directory)})
+    buffer = bytearray(size)
+    write_graph(buffer, header, placed)
+
+    # write to a temporary file first so a crash never leaves
+    # a half written snapshot behind
+    path = snapshot_path(directory)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(buffer)
+    os.replace(temporary, path)
+
+
+def load_snapshot(directory):
+    """
+    Memory maps the snapshot of `directory`.
+
+    Returns None if there is no snapshot, or if it was written by another
+    version or from CSV files that changed since.
+    """
+    try:
+        with open(snapshot_path(directory), "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    header = read_header(mapped)
+    if header is None or header.get("sources") != source_stats(directory):
+        mapped.close()
+        return None
+    return graph_from_buffer(mapped, header)
+
+
+def load_or_build(directory):
+    """
+    Returns the CompactGraph of `directory`, from its snapshot if it is
+    still fresh or from the CSV files otherwise (refreshing the snapshot).
+    """
+    graph = load_snapshot(directory)
+    if graph is not None:
+        return graph
+
+    graph = CompactGraph.from_csv(directory)
+    try:
+        save_snapshot(graph, directory)
+    except OSError:
+        # a read-only data directory only costs us the cache
+        pass
+    return graph
+
+
+def align(position):
+    return (position + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
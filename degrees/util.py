@@ -1,4 +1,12 @@
+import heapq
+from collections import deque
+from itertools import count
+
+
 class Node():
+    # searches allocate one node per person reached, slots keep them small
+    __slots__ = ("state", "parent", "action")
+
     def __init__(self, state, parent, action):
         self.state = state
         self.parent = parent
@@ -36,3 +44,115 @@ class QueueFrontier(StackFrontier):
             node = self.frontier[0]
             self.frontier = self.frontier[1:]
             return node
+
+
+class IndexedStackFrontier():
+    """
+    Stack frontier with O(1) add, remove and contains_state.
+
+    Next to the nodes it keeps a count of how many times each state is
+    waiting in the frontier, so membership never scans the nodes.
+    """
+    def __init__(self):
+        self.frontier = []
+        self.states = {}
+
+    def __len__(self):
+        return len(self.frontier)
+
+    def add(self, node):
+        self.frontier.append(node)
+        self.states[node.state] = self.states.get(node.state, 0) + 1
+
+    def contains_state(self, state):
+        return state in self.states
+
+    def empty(self):
+        return len(self.frontier) == 0
+
+    def remove(self):
+        if self.empty():
+            raise Exception("empty frontier")
+        node = self.pop()
+        self.forget(node.state)
+        return node
+
+    def pop(self):
+        return self.frontier.pop()
+
+    def forget(self, state):
+        remaining = self.states[state] - 1
+        if remaining:
+            self.states[state] = remaining
+        else:
+            del self.states[state]
+
+
+class IndexedQueueFrontier(IndexedStackFrontier):
+    """
+    Queue frontier backed by a deque, so remove is O(1) instead of
+    copying the whole list on every pop.
+    """
+    def __init__(self):
+        self.frontier = deque()
+        self.states = {}
+
+    def pop(self):
+        return self.frontier.popleft()
+
+
+class PriorityFrontier(IndexedStackFrontier):
+    """
+    Frontier backed by a binary heap, removing the node with the lowest
+    priority first.
+
+    Every state waits at most once: adding a waiting state again replaces
+    its node and priority (decrease-key). That is lazy, the old entry
+    stays in the heap and is skipped once it comes out, so `states`
+    keeps counting every waiting state once and `priorities` holds the
+    priority and heap entry of its live node.
+    """
+    def __init__(self):
+        self.frontier = []
+        self.states = {}
+        self.priorities = {}
+        # ties are broken by insertion order so nodes never get compared
+        self.counter = count()
+
+    def __len__(self):
+        return len(self.states)
+
+    def add(self, node, priority=0):
+        entry = next(self.counter)
+        heapq.heappush(self.frontier, (priority, entry, node))
+        if node.state not in self.priorities:
+            self.states[node.state] = 1
+        self.priorities[node.state] = (priority, entry)
+
+    def empty(self):
+        return not self.states
+
+    def best_priority(self, state):
+        """
+        Returns the priority the state is waiting with, or None if the
+        state isn't waiting in the frontier.
+        """
+        waiting = self.priorities.get(state)
+        return None if waiting is None else waiting[0]
+
+    def remove(self):
+        return self.remove_with_priority()[1]
+
+    def remove_with_priority(self):
+        """
+        Removes the lowest priority node and returns (priority, node).
+        """
+        if self.empty():
+            raise Exception("empty frontier")
+        while True:
+            priority, entry, node = heapq.heappop(self.frontier)
+            if self.priorities.get(node.state) == (priority, entry):
+                break
+        del self.priorities[node.state]
+        self.forget(node.state)
+        return priority, node
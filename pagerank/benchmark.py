@@ -0,0 +1,242 @@
+"""
+Benchmarks for pagerank.py
+
+Generates link graphs of three kinds at growing sizes and runs every
+PageRank implementation on each of them, measuring
+
+- the wall time
+- the peak memory allocated while running (tracemalloc, which NumPy
+  reports its arrays to as well), measured in a second run as tracing
+  slows plain Python code down. Tracing only sees this process, so it
+  isn't measured (null in the report) for implementations whose memory
+  lives in worker processes or memory-mapped files
+- the L1 error against a reference solved to 1e-12
+
+The graphs:
+
+- random: every page links to about 8 uniformly random pages
+- scale-free: link counts and link targets both follow power laws, a
+  few pages get most of the links, like the web
+- dangling: random, but 60% of the pages have no links at all
+
+The results are written as a JSON report. Given the report of an
+earlier run, entries that got slower or less accurate are listed.
+
+Usage: python benchmark.py [max_pages] [report] [baseline]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+import outofcore
+import pagerank
+import sampler
+import solvers
+from linkmatrix import LinkMatrix
+
+SIZES = [100, 1000, 10_000, 100_000, 1_000_000]
+
+GRAPHS = ["random", "scale-free", "dangling"]
+
+REFERENCE_TOLERANCE = 1e-12
+
+# entries this much slower than the baseline are regressions
+SLACK = 1.25
+
+
+def generate(kind, n, seed=0):
+    """
+    Returns (source, target) arrays of page indices for a graph of
+    `kind` over n pages.
+    """
+    rng = np.random.default_rng(seed)
+    if kind == "scale-free":
+        degrees = np.minimum(rng.zipf(2.2, n), n - 1)
+        # popular pages are spread over the ids, not all at the front
+        popular = rng.permutation(n)
+        targets = popular[(rng.zipf(1.8, int(degrees.sum())) - 1) % n]
+    elif kind in ("random", "dangling"):
+        degrees = rng.poisson(8, n)
+        if kind == "dangling":
+            degrees[rng.random(n) < 0.6] = 0
+        targets = rng.integers(0, n, int(degrees.sum()))
+    else:
+        raise ValueError(f"unknown graph: {kind}")
+    sources = np.repeat(np.arange(n), degrees)
+    # links to the page itself are dropped, as crawl does
+    keep = sources != targets
+    return sources[keep], targets[keep]
+
+
+def corpus_of(matrix):
+    """
+    Returns the corpus dict of a LinkMatrix, for the dict implementations.
+    """
+    pages = matrix.pages
+    return {
+        page: {pages[j] for j in matrix.out_links[matrix.out_offsets[i]:matrix.out_offsets[i + 1]].tolist()}
+        for i, page in enumerate(pages)
+    }
+
+
+def as_vector(matrix, ranks):
+    return np.array([ranks[page] for page in matrix.pages])
+
+
+def samples_for(n):
+    return min(10_000_000, max(10_000, 10 * n))
+
+
+def python_iterate(matrix, damping_factor):
+    corpus = corpus_of(matrix)
+    return as_vector(matrix, pagerank.iterate_pagerank(corpus, damping_factor, backend="python"))
+
+
+def python_sample(matrix, damping_factor):
+    corpus = corpus_of(matrix)
+    samples = samples_for(matrix.page_count)
+    return as_vector(matrix, pagerank.sample_pagerank(corpus, damping_factor, samples, backend="python"))
+
+
+def solver(name):
+    def run(matrix, damping_factor):
+        rank, _ = solvers.solve(matrix, damping_factor, name)
+        return rank
+    return run
+
+
+def numpy_sample(matrix, damping_factor):
+    return sampler.Sampler(matrix, damping_factor, seed=0).pagerank(samples_for(matrix.page_count))
+
+
+def parallel_sample(matrix, damping_factor):
+    return sampler.parallel_pagerank(matrix, damping_factor, samples_for(matrix.page_count), seed=0).ranks
+
+
+def out_of_core(matrix, damping_factor):
+    with tempfile.TemporaryDirectory() as output:
+        pages = [str(page) for page in matrix.pages]
+        links = ((pages[i], (pages[j] for j in matrix.out_links[matrix.out_offsets[i]:matrix.out_offsets[i + 1]].tolist()))
+                 for i in range(matrix.page_count))
+        outofcore.write_edge_list(output, pages, links)
+        rank, _ = outofcore.EdgeList(output).pagerank(damping_factor)
+        return rank
+
+
+# name: (function(matrix, damping_factor) returning the rank vector, most pages it is run on)
+IMPLEMENTATIONS = {
+    "python-iterate": (python_iterate, 1000),
+    "python-sample": (python_sample, 1000),
+    "jacobi": (solver("jacobi"), None),
+    "gauss-seidel": (solver("gauss-seidel"), None),
+    "aitken": (solver("aitken"), None),
+    "numpy-sample": (numpy_sample, None),
+    "parallel-sample": (parallel_sample, None),
+    "out-of-core": (out_of_core, 100_000),
+}
+
+# implementations tracemalloc can't measure: the sampling pool's workers
+# and the pages of the out-of-core edge list mapped by numpy.memmap
+UNTRACED = {"parallel-sample", "out-of-core"}
+
+
+def measure(function, matrix, damping_factor, traced=True):
+    """
+    Returns (rank vector, seconds, peak bytes allocated) of one
+    implementation, the peak is None unless `traced`.
+    """
+    started = time.perf_counter()
+    rank = function(matrix, damping_factor)
+    seconds = time.perf_counter() - started
+    if not traced:
+        return rank, seconds, None
+
+    tracemalloc.start()
+    try:
+        function(matrix, damping_factor)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return rank, seconds, peak
+
+
+def run(sizes=SIZES, graphs=GRAPHS, implementations=None, damping_factor=pagerank.DAMPING, progress=print):
+    """
+    Runs the benchmarks, returns a list of result dicts.
+    """
+    implementations = implementations or list(IMPLEMENTATIONS)
+    results = []
+    for kind in graphs:
+        for n in sizes:
+            sources, targets = generate(kind, n)
+            matrix = LinkMatrix.from_edges(list(range(n)), sources, targets)
+            reference, _ = solvers.jacobi(matrix, damping_factor, REFERENCE_TOLERANCE)
+            for name in implementations:
+                function, most_pages = IMPLEMENTATIONS[name]
+                if most_pages is not None and n > most_pages:
+                    continue
+                rank, seconds, peak = measure(function, matrix, damping_factor, name not in UNTRACED)
+                result = {
+                    "graph": kind,
+                    "pages": n,
+                    "links": matrix.link_count,
+                    "implementation": name,
+                    "seconds": seconds,
+                    "peak_bytes": peak,
+                    "l1_error": float(np.abs(rank - reference).sum()),
+                }
+                results.append(result)
+                if progress is not None:
+                    memory = "        -    " if peak is None else f"{peak / 2 ** 20:9.1f} MiB"
+                    progress(f"  {kind:10} {n:>9} {name:16} {seconds:9.3f}s "
+                             f"{memory}  error {result['l1_error']:.2e}")
+    return results
+
+
+def regressions(baseline, results, slack=SLACK):
+    """
+    Returns the results slower than `slack` times their baseline entry,
+    or with a larger error than allowed by the baseline's (sampling
+    errors vary from run to run, so they get the same slack).
+    """
+    before = {(b["graph"], b["pages"], b["implementation"]): b for b in baseline}
+    worse = []
+    for result in results:
+        old = before.get((result["graph"], result["pages"], result["implementation"]))
+        if old is None:
+            continue
+        if (result["seconds"] > old["seconds"] * slack
+                or result["l1_error"] > max(old["l1_error"] * slack, REFERENCE_TOLERANCE)):
+            worse.append((old, result))
+    return worse
+
+
+def main():
+    if len(sys.argv) > 4:
+        sys.exit("Usage: python benchmark.py [max_pages] [report] [baseline]")
+    max_pages = int(sys.argv[1]) if len(sys.argv) >= 2 else SIZES[-1]
+    report = sys.argv[2] if len(sys.argv) >= 3 else "benchmark.json"
+    baseline = sys.argv[3] if len(sys.argv) == 4 else None
+
+    results = run([n for n in SIZES if n <= max_pages])
+    with open(report, "w", encoding="utf-8") as f:
+        json.dump({"cpu_count": os.cpu_count(), "results": results}, f, indent=2)
+    print(f"Report written to {report}")
+
+    if baseline is not None:
+        with open(baseline, encoding="utf-8") as f:
+            worse = regressions(json.load(f)["results"], results)
+        print(f"{len(worse)} regressions against {baseline}")
+        for old, new in worse:
+            print(f"  {new['graph']} {new['pages']} {new['implementation']}: "
+                  f"{old['seconds']:.3f}s -> {new['seconds']:.3f}s, "
+                  f"error {old['l1_error']:.2e} -> {new['l1_error']:.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Cached corpus crawler for pagerank.py
+
+Links are pulled out of every HTML file by an HTMLParser fed a chunk at
+a time, so no file is ever held in memory whole, and files are parsed in
+a thread pool. When asked to, the links found are saved to a cache file,
+keyed by every file's name, size and modification time, and on later
+crawls only the files that changed are parsed again. The corpus
+directory itself is never written to.
+"""
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+
+VERSION = 2
+
+# characters read from a file at a time
+CHUNK = 1 << 16
+
+
+class LinkParser(HTMLParser):
+    """
+    Collects the href of every <a> tag fed to it.
+    """
+    def __init__(self):
+        super().__init__()
+        self.links = set()
+
+    def handle_starttag(self, tag, attrs):
+        if tag != "a":
+            return
+        for name, value in attrs:
+            if name == "href" and value is not None:
+                self.links.add(value)
+                break
+
+
+def extract_links(path):
+    """
+    Returns the set of all links of the HTML file at `path`.
+    """
+    parser = LinkParser()
+    with open(path) as f:
+        while True:
+            chunk = f.read(CHUNK)
+            if not chunk:
+                break
+            parser.feed(chunk)
+    parser.close()
+    return parser.links
+
+
+def crawl(directory, cache=None, threads=None):
+    """
+    Returns a dict mapping every page of `directory` to the set of other
+    pages of the corpus it links to, like pagerank.crawl.
+
+    `cache` is the path of a cache file, unchanged files are taken from
+    it and it is brought up to date afterwards. A cache file of another
+    directory is ignored and replaced. `threads` is the size of the
+    parsing pool.
+    """
+    files = {}
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name.endswith(".html") and entry.is_file():
+                stat = entry.stat()
+                files[entry.name] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    cached = load_cache(cache, directory) if cache is not None else {}
+    links = {}
+    stale = []
+    for name, stat in files.items():
+        entry = cached.get(name)
+        if entry is not None and entry["size"] == stat["size"] and entry["mtime_ns"] == stat["mtime_ns"]:
+            links[name] = set(entry["links"])
+        else:
+            stale.append(name)
+
+    if stale:
+        with ThreadPoolExecutor(threads) as pool:
+            paths = [os.path.join(directory, name) for name in stale]
+            for name, found in zip(stale, pool.map(extract_links, paths)):
+                links[name] = found
+
+    if cache is not None and (stale or cached.keys() != files.keys()):
+        save_cache(cache, directory, files, links)
+
+    # only links to other pages of the corpus count
+    return {
+        name: {link for link in found if link in links and link != name}
+        for name, found in links.items()
+    }
+
+
+def load_cache(path, directory):
+    """
+    Returns the cached {name: {"size", "mtime_ns", "links"}} of
+    `directory`, empty if `path` holds no usable cache of it.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if (not isinstance(cache, dict) or cache.get("version") != VERSION
+            or cache.get("directory") != os.path.abspath(directory)):
+        return {}
+    return cache.get("files", {})
+
+
+def save_cache(path, directory, files, links):
+    """
+    Writes the links of every file with its size and modification time.
+    A cache that can't be written is skipped.
+    """
+    cache = {
+        "version": VERSION,
+        "directory": os.path.abspath(directory),
+        "files": {name: dict(stat, links=sorted(links[name])) for name, stat in files.items()},
+    }
+    temporary = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(cache, f)
+        os.replace(temporary, path)
+    except OSError:
+        try:
+            os.remove(temporary)
+        except OSError:
+            pass
@@ -0,0 +1,57 @@
+"""
+HITS scores for pagerank.py
+
+Kleinberg's hubs and authorities: a page is a good authority if good
+hubs link to it, and a good hub if it links to good authorities.
+Starting from equal hub scores the two are computed from each other,
+
+    authorities = transpose of the link matrix times hubs
+    hubs        = link matrix times authorities
+
+normalized to sum to 1 after every step, until neither moves by more
+than the tolerance. The link matrix is the LinkMatrix PageRank uses,
+the transpose is its in-link half, so one build serves both.
+"""
+import numpy as np
+
+from solvers import MAX_ITERATIONS, TOLERANCE, SolverStats, check_norm
+
+
+def hits(matrix, tolerance=TOLERANCE, max_iterations=MAX_ITERATIONS, norm="l1"):
+    """
+    Alternating power iteration over a LinkMatrix, returns (hub vector,
+    authority vector, SolverStats). The change of an iteration is that
+    of the hubs and authorities together.
+    """
+    check_norm(norm)
+    stats = SolverStats("hits", norm, tolerance)
+    n = matrix.page_count
+    hubs = np.full(n, 1 / n)
+    authorities = np.full(n, 1 / n)
+    next_hubs = np.empty(n)
+    next_authorities = np.empty(n)
+    change = np.empty(2 * n)
+
+    while stats.iterations < max_iterations:
+        normalize(matrix.sum_in(hubs, next_authorities))
+        normalize(matrix.sum_out(next_authorities, next_hubs))
+
+        np.subtract(next_hubs, hubs, out=change[:n])
+        np.subtract(next_authorities, authorities, out=change[n:])
+        np.abs(change, out=change)
+        hubs, next_hubs = next_hubs, hubs
+        authorities, next_authorities = next_authorities, authorities
+        if stats.record(change):
+            break
+    return hubs, authorities, stats.finish()
+
+
+def normalize(scores):
+    """
+    Scales `scores` in place to sum to 1, unless they are all 0 (a
+    corpus without links).
+    """
+    total = scores.sum()
+    if total:
+        scores /= total
+    return scores
@@ -0,0 +1,199 @@
+"""
+Incremental PageRank for pagerank.py
+
+After a few pages or links change, the previous ranks are still right
+almost everywhere. Instead of iterating again from 1/N, update_pagerank
+starts from them and only works on the pages whose rank equation no
+longer holds, pushing each one's error (its residual) along its links
+until every residual is small (Gauss-Southwell push).
+
+Pushing works on the unnormalized ranks y solving
+
+    y = damping * P0 y + (1 - damping)
+
+where P0 is the link matrix without the dangling columns. The PageRank
+of the corpus is y / sum(y), the rank dangling pages hand to everybody
+only rescales y. So a dangling page's residual can just be dropped, and
+a change in the number of pages doesn't touch any other page.
+"""
+import numpy as np
+
+from linkmatrix import LinkMatrix, expand
+
+# pushing stops once no page is off by more than this share of its
+# teleport term, which keeps the L1 error of the ranks around it
+TOLERANCE = 1e-6
+
+
+class Diff():
+    """
+    Pages and links (source page, target page) added to or removed
+    from a corpus. Removing a page removes all of its links.
+    """
+    def __init__(self, add_pages=(), remove_pages=(), add_links=(), remove_links=()):
+        self.add_pages = set(add_pages)
+        self.remove_pages = set(remove_pages)
+        self.add_links = set(add_links)
+        self.remove_links = set(remove_links)
+
+    @classmethod
+    def between(cls, old, new):
+        """
+        Returns the Diff turning corpus dict `old` into `new`.
+        """
+        diff = cls(new.keys() - old.keys(), old.keys() - new.keys())
+        for page in old.keys() & new.keys():
+            diff.add_links.update((page, link) for link in new[page] - old[page])
+            diff.remove_links.update((page, link) for link in old[page] - new[page])
+        for page in diff.add_pages:
+            diff.add_links.update((page, link) for link in new[page])
+        return diff
+
+
+class RankUpdate():
+    """
+    The result of update_pagerank: the new link matrix, its rank vector
+    and how much pushing it took.
+    """
+    def __init__(self, matrix, rank, pushes, links_pushed):
+        self.matrix = matrix
+        self.rank = rank
+        self.pushes = pushes
+        self.links_pushed = links_pushed
+
+
+def update_pagerank(matrix, rank, damping_factor, diff, tolerance=TOLERANCE):
+    """
+    Applies `diff` to `matrix` and brings the previous rank vector `rank`
+    (over the pages of `matrix`) up to date, returns a RankUpdate.
+
+    The result is as accurate as `rank` was, the pages the diff doesn't
+    touch aren't checked again.
+    """
+    d = damping_factor
+    new, old_index = apply_diff(matrix, diff)
+
+    # the previous ranks scaled back to y, dangling pages hold D of them
+    # and sum(y) = (1 - d) N / (1 - d + d D)
+    dangling_rank = float(rank[matrix.dangling].sum()) / float(rank.sum())
+    scale = (1 - d) * matrix.page_count / ((1 - d + d * dangling_rank) * float(rank.sum()))
+    y = np.full(new.page_count, 1 - d)
+    kept = old_index != -1
+    y[kept] = rank[old_index[kept]] * scale
+
+    # only the equations of pages with a changed in-link can be off now
+    r = np.zeros(new.page_count)
+    affected = affected_pages(matrix, new, old_index, diff)
+    r[affected] = residual(new, y, affected, d)
+
+    threshold = tolerance * (1 - d)
+    pushes = links_pushed = 0
+    active = affected[np.abs(r[affected]) > threshold]
+    while len(active):
+        push = r[active]
+        y[active] += push
+        r[active] = 0
+        pushes += len(active)
+
+        degree = new.out_degree[active]
+        linked = degree > 0
+        sources, positions = expand(new.out_offsets, active[linked])
+        targets = new.out_links[positions]
+        touched, slots = np.unique(targets, return_inverse=True)
+        r[touched] += np.bincount(slots, weights=(d * push[linked] / degree[linked])[sources])
+        links_pushed += len(targets)
+
+        active = touched[np.abs(r[touched]) > threshold]
+
+    return RankUpdate(new, y / y.sum(), pushes, links_pushed)
+
+
+def apply_diff(matrix, diff):
+    """
+    Returns the LinkMatrix with `diff` applied, and for every one of
+    its pages the index of the same page in `matrix`, -1 for new pages.
+
+    Kept pages keep their order, added pages come after them.
+    """
+    for page in diff.remove_pages:
+        if page not in matrix.index:
+            raise ValueError(f"can't remove unknown page: {page}")
+    added = sorted(page for page in diff.add_pages if page not in matrix.index)
+    if diff.remove_pages:
+        pages = [page for page in matrix.pages if page not in diff.remove_pages] + added
+        index = {page: i for i, page in enumerate(pages)}
+        # new index of every old page, -1 if removed
+        renumber = np.array([index.get(page, -1) for page in matrix.pages], dtype=np.intp)
+    else:
+        # without removals the old indices stay as they are
+        pages = matrix.pages + added
+        index = dict(matrix.index)
+        index.update((page, i) for i, page in enumerate(added, matrix.page_count))
+        renumber = np.arange(matrix.page_count, dtype=np.intp)
+    old_index = np.full(len(pages), -1, dtype=np.intp)
+    old_index[renumber[renumber != -1]] = np.flatnonzero(renumber != -1)
+
+    sources = renumber[np.repeat(np.arange(matrix.page_count), matrix.out_degree)]
+    targets = renumber[matrix.out_links]
+    keep = (sources != -1) & (targets != -1)
+    if diff.remove_links:
+        # links of removed pages are gone already
+        removed = np.array([link_key(index, link, len(pages)) for link in diff.remove_links
+                            if link[0] in index and link[1] in index], dtype=np.int64)
+        keys = sources.astype(np.int64) * len(pages) + targets
+        keep &= ~np.isin(keys, removed)
+    sources, targets = sources[keep], targets[keep]
+
+    if diff.add_links:
+        added = np.array([link_key(index, link, len(pages)) for link in diff.add_links], dtype=np.int64)
+        sources = np.concatenate([sources, added // len(pages)])
+        targets = np.concatenate([targets, added % len(pages)])
+    return LinkMatrix.from_edges(pages, sources, targets, index), old_index
+
+
+def link_key(index, link, n):
+    source, target = link
+    if source not in index or target not in index:
+        raise ValueError(f"link between unknown pages: {source} -> {target}")
+    return index[source] * n + index[target]
+
+
+def affected_pages(old, new, old_index, diff):
+    """
+    Returns the new indices of all pages with a changed in-link: the
+    old and new link targets of every page whose links changed, or that
+    was removed, and the added pages.
+    """
+    changed = {source for source, _ in diff.add_links | diff.remove_links}
+    # removed pages no longer link anywhere, and the pages linking
+    # to them lost that link
+    changed.update(diff.remove_pages)
+    removed = [old.index[page] for page in diff.remove_pages]
+    _, positions = expand(old.in_offsets, np.array(removed, dtype=np.intp))
+    changed.update(old.pages[i] for i in old.in_links[positions].tolist())
+
+    new_rows = np.array([new.index[page] for page in changed if page in new.index], dtype=np.intp)
+    old_rows = np.array([old.index[page] for page in changed if page in old.index], dtype=np.intp)
+    renumber = np.full(old.page_count, -1, dtype=np.intp)
+    renumber[old_index[old_index != -1]] = np.flatnonzero(old_index != -1)
+
+    _, new_positions = expand(new.out_offsets, new_rows)
+    _, old_positions = expand(old.out_offsets, old_rows)
+    pages = np.concatenate([
+        new.out_links[new_positions],
+        renumber[old.out_links[old_positions]],
+        np.flatnonzero(old_index == -1),
+    ])
+    return np.unique(pages[pages != -1])
+
+
+def residual(matrix, y, pages, damping_factor):
+    """
+    Returns how far y is from solving the equation of every page of
+    `pages`: (1 - d) + d * sum of y[u] / out_degree[u] over its in-links, minus y.
+    """
+    rows, positions = expand(matrix.in_offsets, pages)
+    sources = matrix.in_links[positions]
+    incoming = np.bincount(rows, weights=y[sources] * matrix.inverse_degree[sources], minlength=len(pages))
+    return (1 - damping_factor) + damping_factor * incoming - y[pages]
+
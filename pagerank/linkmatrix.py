@@ -0,0 +1,201 @@
+"""
+NumPy link matrix for pagerank.py
+
+The corpus dict is turned into integer page indices once, and its links
+into two compressed sparse row (CSR) arrays: the links out of every page
+(the link matrix) and the links into every page (its transpose). Every
+ranking then works on whole arrays instead of dicts.
+
+PageRank only needs the transpose: the new rank of page j is the sum of
+rank[i] / out_degree[i] over the pages i linking to j. Pages without any
+links (dangling pages) would give a column of all 1/N in the matrix, so
+instead of storing it their total rank is spread over all pages as one
+number per iteration (a rank-one correction). The solvers iterating
+this are in solvers.py.
+"""
+import numpy as np
+
+
+class LinkMatrix():
+    """
+    Links between the pages of a corpus.
+
+    `out_links[out_offsets[i]:out_offsets[i + 1]]` are the indices of the
+    pages page i links to, `in_links[in_offsets[j]:in_offsets[j + 1]]`
+    the indices of the pages linking to page j.
+    """
+    def __init__(self, pages, out_offsets, out_links, in_offsets, in_links, index=None):
+        self.pages = pages
+        self.index = index if index is not None else {page: i for i, page in enumerate(pages)}
+        self.out_offsets = out_offsets
+        self.out_links = out_links
+        self.in_offsets = in_offsets
+        self.in_links = in_links
+
+        self.out_degree = np.diff(out_offsets)
+        self.dangling = self.out_degree == 0
+        # 1 / out degree, 0 for dangling pages whose rank is spread separately
+        self.inverse_degree = np.zeros(len(pages))
+        np.divide(1.0, self.out_degree, out=self.inverse_degree, where=~self.dangling)
+
+        self.in_plan = gather_plan(in_offsets, in_links)
+        self.out_plan = gather_plan(out_offsets, out_links)
+        self.buffers = {}
+
+    @classmethod
+    def from_corpus(cls, corpus):
+        """
+        Builds the link matrix of a corpus dict as returned by crawl,
+        links to pages outside of the corpus are ignored.
+        """
+        pages = sorted(corpus)
+        index = {page: i for i, page in enumerate(pages)}
+        sources, targets = [], []
+        for page in pages:
+            i = index[page]
+            for link in corpus[page]:
+                j = index.get(link)
+                if j is not None:
+                    sources.append(i)
+                    targets.append(j)
+        return cls.from_edges(pages, np.array(sources, dtype=np.intp), np.array(targets, dtype=np.intp))
+
+    @classmethod
+    def from_edges(cls, pages, sources, targets, index=None):
+        """
+        Builds the link matrix from parallel arrays of page indices, one
+        link from sources[e] to targets[e] each. Repeated links count once.
+        `index` maps every page to its index if it's known already.
+        """
+        n = len(pages)
+        # one sorted int64 key per link groups the links by source, and
+        # repeated links end up next to each other
+        keys = unique_sorted(sources.astype(np.int64) * n + targets)
+        sources, targets = np.divmod(keys, n) if n else (keys, keys)
+        # and the same keys the other way around group them by target
+        in_links = np.sort(targets * n + sources) % n if n else keys
+
+        return cls(list(pages), offsets(sources, n), targets.astype(np.intp),
+                   offsets(targets, n), in_links.astype(np.intp), index)
+
+    @property
+    def page_count(self):
+        return len(self.pages)
+
+    @property
+    def link_count(self):
+        return len(self.out_links)
+
+    def spread(self, rank, out):
+        """
+        Writes to `out` the rank every page receives over links when
+        every non-dangling page splits `rank` evenly over its links.
+
+        `rank` is a vector over the pages or a matrix holding one such
+        vector per row. No memory is allocated once the buffers for its
+        shape exist.
+        """
+        contribution, gathered = self.buffers_for(rank.shape, self.in_plan)
+        np.multiply(rank, self.inverse_degree, out=contribution[..., :-1])
+        return segment_sum(contribution, self.in_plan, gathered, out)
+
+    def sum_in(self, values, out):
+        """
+        Writes to `out` the sum of `values` over the pages linking to
+        every page, the transpose of the link matrix times `values`.
+        """
+        return self.sum_over(values, self.in_plan, out)
+
+    def sum_out(self, values, out):
+        """
+        Writes to `out` the sum of `values` over the pages every page
+        links to, the link matrix times `values`.
+        """
+        return self.sum_over(values, self.out_plan, out)
+
+    def sum_over(self, values, plan, out):
+        padded, gathered = self.buffers_for(values.shape, plan)
+        padded[..., :-1] = values
+        return segment_sum(padded, plan, gathered, out)
+
+    def buffers_for(self, shape, plan):
+        """
+        Returns scratch arrays for gathering values of `shape` along `plan`.
+        The extra last column of the first one always stays 0.
+        """
+        key = (shape, id(plan))
+        if key not in self.buffers:
+            values = np.zeros(shape[:-1] + (shape[-1] + 1,))
+            gathered = np.empty(shape[:-1] + (len(plan[0]),))
+            self.buffers[key] = values, gathered
+        return self.buffers[key]
+
+    def ranks(self, vector):
+        """
+        Returns a rank vector as a dict mapping every page to its rank.
+        """
+        return dict(zip(self.pages, vector.tolist()))
+
+
+def unique_sorted(keys):
+    """
+    Returns the distinct values of `keys` in order.
+    """
+    keys = np.sort(keys)
+    keep = np.ones(len(keys), dtype=bool)
+    np.not_equal(keys[1:], keys[:-1], out=keep[1:])
+    return keys[keep]
+
+
+def offsets(keys, n):
+    """
+    Returns the CSR offsets of n rows for row indices `keys`.
+    """
+    result = np.zeros(n + 1, dtype=np.intp)
+    np.cumsum(np.bincount(keys, minlength=n), out=result[1:])
+    return result
+
+
+def expand(offsets, rows):
+    """
+    Returns, for every entry of the CSR rows `rows`, which of them it
+    belongs to and its position in the row data.
+    """
+    counts = offsets[rows + 1] - offsets[rows]
+    owners = np.repeat(np.arange(len(rows)), counts)
+    starts = np.repeat(offsets[rows] - np.cumsum(counts) + counts, counts)
+    return owners, starts + np.arange(len(owners))
+
+
+def gather_plan(offsets, links):
+    """
+    Returns (index, starts) for summing values over CSR rows with one
+    take and one add.reduceat.
+
+    reduceat can't sum an empty row, so every empty row gets a single
+    entry instead, pointing just past the real values to a slot that
+    always holds 0.
+    """
+    n = len(offsets) - 1
+    counts = np.diff(offsets)
+    padded = np.maximum(counts, 1)
+    starts = np.zeros(n, dtype=np.intp)
+    np.cumsum(padded[:-1], out=starts[1:])
+
+    index = np.full(int(padded.sum()), n, dtype=np.intp)
+    rows = np.repeat(np.arange(n), counts)
+    index[starts[rows] + np.arange(len(links)) - offsets[rows]] = links
+    return index, starts
+
+
+def segment_sum(values, plan, gathered, out):
+    """
+    Writes to `out` the sum of `values` over every row of a gather_plan,
+    along the last axis.
+    """
+    index, starts = plan
+    if not len(starts):
+        return out
+    np.take(values, index, axis=-1, out=gathered)
+    np.add.reduceat(gathered, starts, axis=-1, out=out)
+    return out
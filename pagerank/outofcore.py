@@ -0,0 +1,248 @@
+"""
+Out-of-core PageRank for pagerank.py
+
+For corpora too big for a corpus dict or a LinkMatrix, the link graph
+is written to a directory of flat files instead:
+
+    graph.json   page and link counts
+    pages.txt    page names, one per line, a page's id is its line
+    degrees.bin  out degree of every page id (int32)
+    edges.bin    (source id, target id) int32 pairs sorted by target,
+                 then source, without repeats or links to itself
+    ranks.bin    rank of every page id (float64), written by pagerank
+
+The links are sorted out of core: they are first written as they come,
+then split into buckets of target ids small enough to sort in memory.
+
+PageRank then streams edges.bin through numpy.memmap a block at a
+time on every iteration. Only vectors over the pages are kept in memory,
+and as a block's targets are one sorted run its sums need no memory
+over all the pages either.
+
+Usage: python outofcore.py corpus output [k]
+"""
+import json
+import math
+import os
+import sys
+from array import array
+
+import numpy as np
+
+import crawler
+from linkmatrix import unique_sorted
+from pagerank import DAMPING
+from solvers import MAX_ITERATIONS, TOLERANCE, SolverStats, check_norm
+
+VERSION = 1
+
+EDGE_TYPE = np.int32
+EDGE_TYPECODE = "i"
+
+# links read from disk at a time
+BLOCK_EDGES = 1 << 22
+
+# links sorted in memory at a time while writing
+BUCKET_EDGES = 1 << 24
+
+
+def write_edge_list(output, pages, links, bucket_edges=BUCKET_EDGES):
+    """
+    Writes the link graph to the directory `output`.
+
+    `pages` are the page names, `links` an iterable of (page, linked
+    pages) that is only walked once. Links to unknown pages are dropped.
+    """
+    os.makedirs(output, exist_ok=True)
+    index = {}
+    with open(os.path.join(output, "pages.txt"), "w", encoding="utf-8") as f:
+        for page in pages:
+            if page not in index:
+                index[page] = len(index)
+                f.write(page + "\n")
+    n = len(index)
+
+    # first pass: every link as it comes
+    raw = os.path.join(output, "edges.raw")
+    count = 0
+    with open(raw, "wb") as f:
+        # flat source, target, source, ... ids, 8 bytes per link
+        pending = array(EDGE_TYPECODE)
+        for page, linked in links:
+            source = index.get(page)
+            if source is None:
+                continue
+            for link in linked:
+                target = index.get(link)
+                if target is not None and target != source:
+                    pending.append(source)
+                    pending.append(target)
+            if len(pending) >= 2 * BLOCK_EDGES:
+                pending.tofile(f)
+                count += len(pending) // 2
+                pending = array(EDGE_TYPECODE)
+        pending.tofile(f)
+        count += len(pending) // 2
+
+    # second pass: split into buckets of target ids, then sort each one
+    buckets = max(1, math.ceil(count / bucket_edges))
+    bucket_paths = [os.path.join(output, f"edges.{bucket}.tmp") for bucket in range(buckets)]
+    edges = np.memmap(raw, dtype=EDGE_TYPE, mode="r", shape=(count, 2)) if count else np.empty((0, 2), EDGE_TYPE)
+    files = [open(path, "wb") for path in bucket_paths]
+    try:
+        for start in range(0, count, BLOCK_EDGES):
+            block = np.asarray(edges[start:start + BLOCK_EDGES])
+            bucket_of = block[:, 1].astype(np.int64) * buckets // n
+            order = np.argsort(bucket_of, kind="stable")
+            bounds = np.searchsorted(bucket_of[order], np.arange(buckets + 1))
+            block = block[order]
+            for bucket in range(buckets):
+                if bounds[bucket] < bounds[bucket + 1]:
+                    block[bounds[bucket]:bounds[bucket + 1]].tofile(files[bucket])
+    finally:
+        for f in files:
+            f.close()
+        del edges
+    os.remove(raw)
+
+    degrees = np.zeros(n, dtype=np.int64)
+    links_written = 0
+    with open(os.path.join(output, "edges.bin"), "wb") as f:
+        for path in bucket_paths:
+            block = np.fromfile(path, dtype=EDGE_TYPE).reshape(-1, 2)
+            os.remove(path)
+            keys = unique_sorted(block[:, 1].astype(np.int64) * n + block[:, 0])
+            sources, targets = keys % n, keys // n
+            np.stack([sources, targets], axis=1).astype(EDGE_TYPE).tofile(f)
+            degrees += np.bincount(sources, minlength=n)
+            links_written += len(keys)
+
+    degrees.astype(EDGE_TYPE).tofile(os.path.join(output, "degrees.bin"))
+    with open(os.path.join(output, "graph.json"), "w", encoding="utf-8") as f:
+        json.dump({"version": VERSION, "pages": n, "links": links_written}, f)
+
+
+def write_corpus(output, corpus):
+    """
+    Writes a corpus dict as returned by crawl.
+    """
+    write_edge_list(output, sorted(corpus), corpus.items())
+
+
+def write_directory(output, directory):
+    """
+    Writes the link graph of a directory of HTML pages, parsing one page
+    at a time without building the corpus dict.
+    """
+    pages = sorted(name for name in os.listdir(directory) if name.endswith(".html"))
+    links = ((page, crawler.extract_links(os.path.join(directory, page))) for page in pages)
+    write_edge_list(output, pages, links)
+
+
+class EdgeList():
+    """
+    A link graph written by write_edge_list, with its files mapped.
+    """
+    def __init__(self, output):
+        self.output = output
+        with open(os.path.join(output, "graph.json"), encoding="utf-8") as f:
+            header = json.load(f)
+        if header.get("version") != VERSION:
+            raise ValueError(f"{output} holds an edge list of another version")
+        self.page_count = header["pages"]
+        self.link_count = header["links"]
+        self.degrees = np.memmap(os.path.join(output, "degrees.bin"), dtype=EDGE_TYPE, mode="r",
+                                 shape=(self.page_count,))
+        self.edges = None
+        if self.link_count:
+            self.edges = np.memmap(os.path.join(output, "edges.bin"), dtype=EDGE_TYPE, mode="r",
+                                   shape=(self.link_count, 2))
+
+    def spread(self, contribution, out):
+        """
+        Writes to `out` the sum of contribution[source] over the links
+        into every page, reading the links a block at a time.
+        """
+        out.fill(0)
+        for start in range(0, self.link_count, BLOCK_EDGES):
+            block = np.asarray(self.edges[start:start + BLOCK_EDGES])
+            sources, targets = block[:, 0], block[:, 1]
+            # targets are sorted, so the block only covers pages first to last
+            first, last = int(targets[0]), int(targets[-1])
+            out[first:last + 1] += np.bincount(targets - first, weights=contribution[sources],
+                                               minlength=last - first + 1)
+        return out
+
+    def pagerank(self, damping_factor, tolerance=TOLERANCE, max_iterations=MAX_ITERATIONS, norm="l1"):
+        """
+        Power iteration over the streamed links, writes the ranks to
+        ranks.bin and returns (rank vector, SolverStats).
+        """
+        check_norm(norm)
+        stats = SolverStats("out-of-core", norm, tolerance)
+        d = damping_factor
+        n = self.page_count
+        degrees = np.asarray(self.degrees)
+        dangling = degrees == 0
+        inverse_degree = np.zeros(n)
+        np.divide(1.0, degrees, out=inverse_degree, where=~dangling)
+
+        rank = np.full(n, 1 / n)
+        following = np.empty(n)
+        contribution = np.empty(n)
+        change = np.empty(n)
+        while stats.iterations < max_iterations:
+            np.multiply(rank, inverse_degree, out=contribution)
+            self.spread(contribution, following)
+            # teleporting plus the rank of dangling pages, which link everywhere
+            following *= d
+            following += (1 - d) / n + d * float(rank[dangling].sum()) / n
+
+            np.subtract(following, rank, out=change)
+            np.abs(change, out=change)
+            rank, following = following, rank
+            if stats.record(change):
+                break
+
+        rank.tofile(os.path.join(self.output, "ranks.bin"))
+        return rank, stats.finish()
+
+
+def top_pages(output, k=10):
+    """
+    Returns the k best ranked (page, rank) of a ranks.bin written by
+    EdgeList.pagerank, reading only those pages' names.
+    """
+    ranks = np.memmap(os.path.join(output, "ranks.bin"), dtype=np.float64, mode="r")
+    k = min(k, len(ranks))
+    if not k:
+        return []
+    best = np.argpartition(-ranks, k - 1)[:k]
+    best = best[np.argsort(-ranks[best], kind="stable")]
+
+    wanted = set(best.tolist())
+    names = {}
+    with open(os.path.join(output, "pages.txt"), encoding="utf-8") as f:
+        for page_id, line in enumerate(f):
+            if page_id in wanted:
+                names[page_id] = line.rstrip("\n")
+                if len(names) == len(wanted):
+                    break
+    return [(names[page_id], float(ranks[page_id])) for page_id in best.tolist()]
+
+
+def main():
+    if len(sys.argv) not in (3, 4):
+        sys.exit("Usage: python outofcore.py corpus output [k]")
+    directory, output = sys.argv[1], sys.argv[2]
+    k = int(sys.argv[3]) if len(sys.argv) == 4 else 10
+
+    write_directory(output, directory)
+    rank, stats = EdgeList(output).pagerank(DAMPING)
+    print(f"PageRank Results out of core ({stats.iterations} iterations, {stats.seconds:.2f}s)")
+    for page, rank in top_pages(output, k):
+        print(f"  {page}: {rank:.4f}")
+
+
+if __name__ == "__main__":
+    main()
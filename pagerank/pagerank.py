@@ -1,9 +1,24 @@
-import os
 import random
-import re
 import sys
 import copy
 from pprint import pprint
+
+import crawler
+
+# the NumPy backend is optional, without NumPy everything runs on dicts
+try:
+    import hits
+    import linkmatrix
+    import personalized
+    import sampler
+    import solvers
+except ImportError:
+    hits = None
+    linkmatrix = None
+    personalized = None
+    sampler = None
+    solvers = None
+
 DAMPING = 0.85
 SAMPLES = 10000
 
@@ -22,32 +37,16 @@ def main():
         print(f"  {page}: {ranks[page]:.4f}")
 
 
-def crawl(directory):
+def crawl(directory, cache=None):
     """
     Parse a directory of HTML pages and check for links to other pages.
     Return a dictionary where each key is a page, and values are
     a list of all other pages in the corpus that are linked to by the page.
-    """
-    pages = dict()
-
-    # Extract all links from HTML files
-    for filename in os.listdir(directory):
-        if not filename.endswith(".html"):
-            continue
-        with open(os.path.join(directory, filename)) as f:
-            contents = f.read()
-            links = re.findall(r"<a\s+(?:[^>]*?)href=\"([^\"]*)\"", contents)
-            pages[filename] = set(links) - {filename}
-
-    # Only include links to other pages in the corpus
-    for filename in pages:
-        pages[filename] = set(
-            link for link in pages[filename]
-            if link in pages
-        )
-
-    return pages
 
+    Links are parsed by crawler.py. With `cache`, the path of a cache
+    file, only files changed since the last crawl are parsed again.
+    """
+    return crawler.crawl(directory, cache)
 
 
 def transition_model(corpus, page, damping_factor):
@@ -92,7 +91,7 @@ def transition_model(corpus, page, damping_factor):
         
 
 
-def sample_pagerank(corpus, damping_factor, n):
+def sample_pagerank(corpus, damping_factor, n, backend=None, seed=None, walkers=1):
     """
     Return PageRank values for each page by sampling `n` pages
     according to transition model, starting with a page at random.
@@ -100,7 +99,19 @@ def sample_pagerank(corpus, damping_factor, n):
     Return a dictionary where keys are page names, and values are
     their estimated PageRank value (a value between 0 and 1). All
     PageRank values should sum to 1.
+
+    `backend` is "numpy" for the batched sampler of sampler.py or "python"
+    for the one below, by default NumPy is used when it is installed.
+    `seed` seeds the NumPy random generator. With more than one of
+    `walkers` they split the samples between them and run in parallel,
+    see sampler.parallel_pagerank for their confidence intervals.
     """
+    if backend_for(backend) == "numpy":
+        matrix = linkmatrix.LinkMatrix.from_corpus(corpus)
+        if walkers > 1:
+            return matrix.ranks(sampler.parallel_pagerank(matrix, damping_factor, n, walkers, seed=seed).ranks)
+        return matrix.ranks(sampler.Sampler(matrix, damping_factor, seed).pagerank(n))
+
     pagerank = {}
     # initialize the pagerank dictionary with all the pages in the corpus
     for page in corpus:
@@ -123,7 +134,8 @@ def sample_pagerank(corpus, damping_factor, n):
     
 
 
-def iterate_pagerank(corpus, damping_factor):
+def iterate_pagerank(corpus, damping_factor, backend=None, solver="jacobi", tolerance=0.001,
+                     max_iterations=None, norm="max"):
     """
     Return PageRank values for each page by iteratively updating
     PageRank values until convergence.
@@ -131,7 +143,28 @@ def iterate_pagerank(corpus, damping_factor):
     Return a dictionary where keys are page names, and values are
     their estimated PageRank value (a value between 0 and 1). All
     PageRank values should sum to 1.
+
+    `backend` is "numpy" for the sparse matrix power iteration of
+    linkmatrix.py or "python" for the dict based one below, by default
+    NumPy is used when it is installed.
+
+    Iteration stops once no page moves more than `tolerance`, or with
+    `norm` "l1" once all pages together move less, or after
+    `max_iterations`. The NumPy backend can use any `solver` of
+    solvers.py, solvers.solve also reports how it converged.
     """
+    if backend_for(backend) == "numpy":
+        matrix = linkmatrix.LinkMatrix.from_corpus(corpus)
+        if max_iterations is None:
+            max_iterations = solvers.MAX_ITERATIONS
+        rank, _ = solvers.solve(matrix, damping_factor, solver, tolerance=tolerance,
+                                max_iterations=max_iterations, norm=norm)
+        return matrix.ranks(rank)
+    if solver != "jacobi":
+        raise ValueError("the python backend only has the jacobi solver")
+    if norm not in ("l1", "max"):
+        raise ValueError(f"unknown norm: {norm}")
+
     # first we will initialize the pagerank dictionary with all the pages in the corpus
     # each page will have a value of 1/n at the start
     # n being the number of pages in the corpus
@@ -146,47 +179,40 @@ def iterate_pagerank(corpus, damping_factor):
     random_probability = (1 - damping_factor) / len(corpus)
     
     
-    while True:
-        did_converge  = True
+    iterations = 0
+    while max_iterations is None or iterations < max_iterations:
+        iterations += 1
+        total_change = 0
         # make a copy of the current page rank scores
         current_pagerank = copy.deepcopy(pagerank)
 
 
 
+        # pages without any links are treated as linking to every page in the corpus including themselves
+        # so each of them hands an equal share of its rank to every page
+        dangling_rank = sum(current_pagerank[linked_page] for linked_page in corpus if corpus[linked_page] == set())
+
         for page in corpus:
             
-            # add the random constant
-            pagerank[page] = random_probability
+            # add the random constant and the share of the pages without links
+            pagerank[page] = random_probability + damping_factor * ( dangling_rank / len(corpus) )
 
-            # check if the page has any links
-            # if none then we will calculate as if it has a link to every page in the corpus including itself
-            if corpus[page] == set():
-                for linked_page in corpus:
-                    pagerank[page] += damping_factor * ( current_pagerank[linked_page] / len(corpus) )
+            # this is the same as the sigma notation
+            # we are going to go through each page that links to the current page
+            # for each linked page add it to the pagerank value after damping it with a factor
 
-                # check for the difference between the current pagerank score and the newly calculated pagerank score
-                # if the difference is greater than 0.001 then we will set the did_converge variable to false meaning
-                # we haven't converged yet hence we will continue this process until convergence
-                if abs(pagerank[page] - current_pagerank[page]) > 0.001:
-                    did_converge = False
-            else:
+            for linked_page in pointing_pages(corpus, page):
 
-                # this is the same as the sigma notation
-                # we are going to go through each page that links to the current page
-                # for each linked page add it to the pagerank value after damping it with a factor
+                pagerank[page] += damping_factor * ( current_pagerank[linked_page] / len(corpus[linked_page]) )
 
-                for linked_page in pointing_pages(corpus, page):
 
-                    pagerank[page] += damping_factor * ( current_pagerank[linked_page] / len(corpus[linked_page]) )
+            # add up the difference between the current pagerank score and the newly calculated pagerank score
+            # or keep the biggest one for the max norm, once it is at most the tolerance we have converged
+            # otherwise we will continue this process until convergence
+            change = abs(pagerank[page] - current_pagerank[page])
+            total_change = total_change + change if norm == "l1" else max(total_change, change)
 
-
-                # check for the difference between the current pagerank score and the newly calculated pagerank score
-                # if the difference is greater than 0.001 then we will set the did_converge variable to false meaning
-                # we haven't converged yet hence we will continue this process until convergence
-                if abs(pagerank[page] - current_pagerank[page]) > 0.001:
-                    did_converge = False
-
-        if did_converge:
+        if total_change <= tolerance:
             break
 
     return pagerank
@@ -194,6 +220,61 @@ def iterate_pagerank(corpus, damping_factor):
 
 
 
+def personalized_pagerank(corpus, seed_sets, damping_factor, epsilon=None):
+    """
+    Return PageRank values where the random surfer only ever teleports
+    to the pages of a seed set, for each seed set in `seed_sets`.
+
+    Return a list with one dictionary per seed set, mapping every page
+    to its rank. All seed sets are solved together over one link matrix,
+    or with `epsilon` approximated one by one by forward push, which only
+    visits the pages around the seeds. See personalized.py, which needs
+    NumPy.
+    """
+    backend_for("numpy")
+    matrix = linkmatrix.LinkMatrix.from_corpus(corpus)
+    if epsilon is not None:
+        return [matrix.ranks(personalized.push_pagerank(matrix, seeds, damping_factor, epsilon))
+                for seeds in seed_sets]
+    teleports = personalized.teleport_matrix(matrix, seed_sets)
+    ranks = personalized.personalized_pagerank(matrix, teleports, damping_factor)
+    return [matrix.ranks(rank) for rank in ranks]
+
+
+def score_corpus(corpus, damping_factor):
+    """
+    Return the PageRank, hub and authority (HITS) scores of every page,
+    as a dictionary mapping "pagerank", "hubs" and "authorities" to
+    dictionaries mapping every page to its score.
+
+    All of them are computed from one link matrix, see hits.py, which
+    needs NumPy.
+    """
+    backend_for("numpy")
+    matrix = linkmatrix.LinkMatrix.from_corpus(corpus)
+    rank, _ = solvers.jacobi(matrix, damping_factor)
+    hubs, authorities, _ = hits.hits(matrix)
+    return {
+        "pagerank": matrix.ranks(rank),
+        "hubs": matrix.ranks(hubs),
+        "authorities": matrix.ranks(authorities),
+    }
+
+
+def backend_for(backend):
+    """
+    Return the backend to use for a `backend` argument, NumPy unless
+    it isn't installed when none is asked for.
+    """
+    if backend is None:
+        return "python" if linkmatrix is None else "numpy"
+    if backend == "numpy" and linkmatrix is None:
+        raise ValueError("the numpy backend needs NumPy installed")
+    if backend not in ("numpy", "python"):
+        raise ValueError(f"unknown backend: {backend}")
+    return backend
+
+
 def pointing_pages(corpus, page):
     """
     Return a list of pages pointing to the given page.
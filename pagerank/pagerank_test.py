@@ -0,0 +1,509 @@
+"""
+Tests for pagerank.py
+
+Make sure that this file is in the same directory as pagerank.py, the
+corpora are read from corpus0, corpus1 and corpus2 next to it.
+
+Every backend is checked against the PageRank equations solved directly
+with a dense matrix.
+"""
+import os
+import random
+import shutil
+
+import numpy as np
+import pytest
+
+import benchmark
+import crawler
+import hits
+import outofcore
+import pagerank
+import personalized
+import solvers
+from incremental import Diff, update_pagerank
+from linkmatrix import LinkMatrix
+from sampler import Sampler, parallel_pagerank
+
+CORPORA = ["corpus0", "corpus1", "corpus2"]
+
+
+def dense_pagerank(corpus, damping_factor, teleport=None):
+    """
+    Solves the PageRank equations of `corpus` with np.linalg.solve,
+    returns the rank vector over the pages in sorted order.
+
+    `teleport` is the vector the surfer jumps to, which dangling pages
+    link to as well, uniform by default.
+    """
+    pages = sorted(corpus)
+    n = len(pages)
+    index = {page: i for i, page in enumerate(pages)}
+    teleport = np.full(n, 1 / n) if teleport is None else teleport
+    links = np.zeros((n, n))
+    for page, linked in corpus.items():
+        if linked:
+            for link in linked:
+                links[index[link], index[page]] = 1 / len(linked)
+        else:
+            links[:, index[page]] = teleport
+    return np.linalg.solve(np.eye(n) - damping_factor * links, (1 - damping_factor) * teleport)
+
+
+def as_vector(ranks):
+    return np.array([ranks[page] for page in sorted(ranks)])
+
+
+@pytest.mark.parametrize("directory", CORPORA)
+@pytest.mark.parametrize("backend", ["python", "numpy"])
+def test_iterate_pagerank(directory, backend):
+    corpus = pagerank.crawl(directory)
+    ranks = pagerank.iterate_pagerank(corpus, pagerank.DAMPING, backend=backend, tolerance=1e-12)
+    assert ranks.keys() == corpus.keys()
+    assert as_vector(ranks) == pytest.approx(dense_pagerank(corpus, pagerank.DAMPING), abs=1e-9)
+    assert sum(ranks.values()) == pytest.approx(1)
+
+
+def test_iterate_pagerank_dangling():
+    # 3 links nowhere, its rank goes to every page
+    corpus = {"1": {"2"}, "2": {"1", "3"}, "3": set()}
+    for backend in ("python", "numpy"):
+        ranks = pagerank.iterate_pagerank(corpus, pagerank.DAMPING, backend=backend, tolerance=1e-12)
+        assert as_vector(ranks) == pytest.approx(dense_pagerank(corpus, pagerank.DAMPING), abs=1e-9)
+
+
+def test_link_matrix():
+    corpus = pagerank.crawl("corpus2")
+    matrix = LinkMatrix.from_corpus(corpus)
+    assert matrix.pages == sorted(corpus)
+    assert matrix.link_count == sum(len(links) for links in corpus.values())
+    for page, links in corpus.items():
+        i = matrix.index[page]
+        out_links = matrix.out_links[matrix.out_offsets[i]:matrix.out_offsets[i + 1]]
+        assert {matrix.pages[j] for j in out_links} == links
+        in_links = matrix.in_links[matrix.in_offsets[i]:matrix.in_offsets[i + 1]]
+        assert {matrix.pages[j] for j in in_links} == {source for source in corpus if page in corpus[source]}
+
+    # spread is the link matrix without its dangling columns times the
+    # ranks, for one vector or one per row
+    dense = np.zeros((matrix.page_count, matrix.page_count))
+    for page, links in corpus.items():
+        for link in links:
+            dense[matrix.index[link], matrix.index[page]] = 1 / len(links)
+    rank = np.random.default_rng(0).random((3, matrix.page_count))
+    assert matrix.spread(rank[0], np.empty(matrix.page_count)) == pytest.approx(dense @ rank[0])
+    assert matrix.spread(rank, np.empty_like(rank)) == pytest.approx(rank @ dense.T)
+
+
+def test_link_matrix_from_edges():
+    # repeated links count once, page 2 has no links either way
+    matrix = LinkMatrix.from_edges(["a", "b", "c"], np.array([0, 0, 1, 0]), np.array([1, 1, 0, 2]))
+    assert matrix.link_count == 3
+    assert matrix.out_degree.tolist() == [2, 1, 0]
+    assert matrix.dangling.tolist() == [False, False, True]
+    assert matrix.in_links[matrix.in_offsets[0]:matrix.in_offsets[1]].tolist() == [1]
+
+
+@pytest.mark.parametrize("directory", CORPORA)
+def test_sampler(directory):
+    corpus = pagerank.crawl(directory)
+    matrix = LinkMatrix.from_corpus(corpus)
+    rank = Sampler(matrix, pagerank.DAMPING, seed=0).pagerank(200_000)
+    assert rank.sum() == pytest.approx(1)
+    assert rank == pytest.approx(dense_pagerank(corpus, pagerank.DAMPING), abs=0.01)
+    # the same seed walks the same pages
+    assert Sampler(matrix, pagerank.DAMPING, seed=0).pagerank(200_000).tolist() == rank.tolist()
+
+
+def test_sampler_start():
+    # always following links, the surfer goes back and forth between
+    # its first page and the one that links to
+    matrix = LinkMatrix.from_corpus({"1": {"2"}, "2": {"1"}, "3": set()})
+    visits = Sampler(matrix, 1, seed=0).walk(10, start=0)
+    assert visits.tolist() == [5, 5, 0]
+
+
+@pytest.mark.parametrize("backend", ["python", "numpy"])
+def test_sample_pagerank(backend):
+    random.seed(0)
+    corpus = pagerank.crawl("corpus2")
+    ranks = pagerank.sample_pagerank(corpus, pagerank.DAMPING, pagerank.SAMPLES, backend=backend, seed=0)
+    assert ranks.keys() == corpus.keys()
+    assert sum(ranks.values()) == pytest.approx(1)
+    assert as_vector(ranks) == pytest.approx(dense_pagerank(corpus, pagerank.DAMPING), abs=0.05)
+
+
+def test_parallel_pagerank():
+    corpus = pagerank.crawl("corpus2")
+    matrix = LinkMatrix.from_corpus(corpus)
+    exact = dense_pagerank(corpus, pagerank.DAMPING)
+    estimate = parallel_pagerank(matrix, pagerank.DAMPING, 100_001, walkers=8, processes=1, seed=0)
+    assert estimate.samples == 100_001
+    assert estimate.walkers == 8
+    assert estimate.ranks.sum() == pytest.approx(1)
+    # 95% intervals, so allow some slack rather than a flaky test
+    assert (np.abs(estimate.ranks - exact) <= 2 * estimate.half_width).all()
+
+    # every surfer has its own seed, so the pool walks the same pages
+    pooled = parallel_pagerank(matrix, pagerank.DAMPING, 100_001, walkers=8, processes=2, seed=0)
+    assert pooled.ranks.tolist() == estimate.ranks.tolist()
+
+    # the interval halves with four times the samples
+    assert estimate.samples_needed(estimate.half_width.max() / 2) == pytest.approx(4 * 100_001, rel=1e-3)
+
+
+def test_parallel_pagerank_one_walker():
+    matrix = LinkMatrix.from_corpus(pagerank.crawl("corpus0"))
+    estimate = parallel_pagerank(matrix, pagerank.DAMPING, 1000, walkers=1, processes=1, seed=0)
+    assert np.isinf(estimate.half_width).all()
+
+
+def test_crawl_cache(tmp_path, monkeypatch):
+    directory = tmp_path / "corpus"
+    shutil.copytree("corpus2", directory)
+    cache = tmp_path / "links.cache"
+    corpus = pagerank.crawl(directory, cache=cache)
+    assert corpus == pagerank.crawl("corpus2")
+    # the cache is written where it was asked for, never into the corpus
+    assert cache.exists()
+    assert sorted(os.listdir(directory)) == sorted(os.listdir("corpus2"))
+
+    parsed = []
+    extract_links = crawler.extract_links
+
+    def counting(path):
+        parsed.append(os.path.basename(path))
+        return extract_links(path)
+
+    monkeypatch.setattr(crawler, "extract_links", counting)
+    assert pagerank.crawl(directory, cache=cache) == corpus
+    assert parsed == []
+
+    # only the changed file is parsed again
+    (directory / "ai.html").write_text('<a href="c.html">C</a> <a href="logic.html">Logic</a>')
+    corpus = pagerank.crawl(directory, cache=cache)
+    assert parsed == ["ai.html"]
+    assert corpus["ai.html"] == {"c.html", "logic.html"}
+
+    # a cache of another directory is ignored and replaced
+    parsed.clear()
+    assert pagerank.crawl("corpus2", cache=cache) == pagerank.crawl("corpus2", cache=cache)
+    assert sorted(parsed) == sorted(os.listdir("corpus2"))
+
+
+def test_extract_links_chunks(monkeypatch):
+    # tags split across chunks are still found
+    links = crawler.extract_links("corpus2/ai.html")
+    monkeypatch.setattr(crawler, "CHUNK", 7)
+    assert crawler.extract_links("corpus2/ai.html") == links
+
+
+def changed_corpus(corpus):
+    """
+    Returns a copy of corpus2 with a page added and removed, and links
+    added and removed.
+    """
+    new = {page: set(links) for page, links in corpus.items() if page != "c.html"}
+    for links in new.values():
+        links.discard("c.html")
+    new["search.html"] = {"ai.html", "algorithms.html"}
+    new["ai.html"].add("search.html")
+    new["python.html"].add("recursion.html")
+    new["logic.html"].discard("inference.html")
+    return new
+
+
+def test_update_pagerank():
+    corpus = pagerank.crawl("corpus2")
+    matrix = LinkMatrix.from_corpus(corpus)
+    rank, _ = solvers.jacobi(matrix, pagerank.DAMPING, tolerance=1e-12)
+    new = changed_corpus(corpus)
+    diff = Diff.between(corpus, new)
+    assert diff.add_pages == {"search.html"}
+    assert diff.remove_pages == {"c.html"}
+    assert ("python.html", "recursion.html") in diff.add_links
+    assert ("logic.html", "inference.html") in diff.remove_links
+
+    update = update_pagerank(matrix, rank, pagerank.DAMPING, diff, tolerance=1e-10)
+    assert update.pushes > 0
+    assert set(update.matrix.pages) == new.keys()
+    assert as_vector(update.matrix.ranks(update.rank)) == pytest.approx(
+        dense_pagerank(new, pagerank.DAMPING), abs=1e-8)
+
+
+def test_update_pagerank_nothing_changed():
+    corpus = pagerank.crawl("corpus1")
+    matrix = LinkMatrix.from_corpus(corpus)
+    rank, _ = solvers.jacobi(matrix, pagerank.DAMPING, tolerance=1e-12)
+    update = update_pagerank(matrix, rank, pagerank.DAMPING, Diff())
+    assert update.pushes == 0
+    assert update.rank == pytest.approx(rank)
+
+
+def test_update_pagerank_unknown_page():
+    matrix = LinkMatrix.from_corpus(pagerank.crawl("corpus0"))
+    with pytest.raises(ValueError):
+        update_pagerank(matrix, np.full(4, 0.25), pagerank.DAMPING, Diff(remove_pages=["5.html"]))
+    with pytest.raises(ValueError):
+        update_pagerank(matrix, np.full(4, 0.25), pagerank.DAMPING, Diff(add_links=[("1.html", "5.html")]))
+
+
+def dense_personalized(corpus, seeds, damping_factor):
+    pages = sorted(corpus)
+    teleport = np.array([page in seeds for page in pages]) / len(seeds)
+    return dense_pagerank(corpus, damping_factor, teleport)
+
+
+def test_personalized_pagerank(monkeypatch):
+    # blocks of 2 seed sets, the last one on its own
+    monkeypatch.setattr(personalized, "BLOCK", 2)
+    corpus = pagerank.crawl("corpus2")
+    seed_sets = [{"ai.html"}, {"recursion.html"}, {"c.html", "python.html"}, {"logic.html"}, set(corpus)]
+    ranks = pagerank.personalized_pagerank(corpus, seed_sets, pagerank.DAMPING)
+    assert len(ranks) == len(seed_sets)
+    for seeds, rank in zip(seed_sets, ranks):
+        exact = dense_personalized(corpus, seeds, pagerank.DAMPING)
+        assert as_vector(rank) == pytest.approx(exact, abs=1e-6)
+    # teleporting anywhere is plain PageRank
+    assert as_vector(ranks[-1]) == pytest.approx(dense_pagerank(corpus, pagerank.DAMPING), abs=1e-6)
+
+    with pytest.raises(ValueError):
+        pagerank.personalized_pagerank(corpus, [set()], pagerank.DAMPING)
+
+
+def reachable(corpus, seeds):
+    found = set(seeds)
+    frontier = list(seeds)
+    while frontier:
+        for link in corpus[frontier.pop()] - found:
+            found.add(link)
+            frontier.append(link)
+    return np.array([page in found for page in sorted(corpus)])
+
+
+@pytest.mark.parametrize("epsilon", [1e-3, 1e-5])
+def test_push_pagerank(epsilon):
+    matrix = LinkMatrix.from_edges(list(range(500)), *benchmark.generate("dangling", 500))
+    corpus = benchmark.corpus_of(matrix)
+    seeds = {0, 1, 2}
+    exact = dense_personalized(corpus, seeds, pagerank.DAMPING)
+    rank = personalized.push_pagerank(matrix, seeds, pagerank.DAMPING, epsilon)
+    # push only ever adds rank, and what is left to push is at most
+    # epsilon per link (at least 1) on every page
+    assert (rank <= exact + 1e-12).all()
+    assert np.abs(exact - rank).sum() <= epsilon * np.maximum(matrix.out_degree, 1).sum()
+    # and it never visits pages the seeds can't reach
+    assert not rank[~reachable(corpus, seeds)].any()
+
+
+def generated(kind, n):
+    """
+    Returns (corpus, LinkMatrix) of a benchmark graph over pages 0 to n - 1.
+    """
+    matrix = LinkMatrix.from_edges(list(range(n)), *benchmark.generate(kind, n))
+    return benchmark.corpus_of(matrix), matrix
+
+
+@pytest.mark.parametrize("kind", benchmark.GRAPHS)
+@pytest.mark.parametrize("solver", list(solvers.SOLVERS))
+def test_solvers(kind, solver):
+    corpus, matrix = generated(kind, 1000)
+    exact = dense_pagerank(corpus, pagerank.DAMPING)
+    rank, stats = solvers.solve(matrix, pagerank.DAMPING, solver, tolerance=1e-10)
+    assert stats.converged
+    assert stats.solver == solver
+    assert stats.residuals[-1] <= 1e-10 < stats.residuals[0]
+    assert np.abs(rank - exact).sum() == pytest.approx(0, abs=1e-8)
+
+    # far fewer iterations than allowed and it stops short of converging
+    rank, stats = solvers.solve(matrix, pagerank.DAMPING, solver, tolerance=1e-10, max_iterations=5)
+    assert stats.iterations == 5
+    assert not stats.converged
+
+
+@pytest.mark.parametrize("directory", CORPORA)
+@pytest.mark.parametrize("solver", list(solvers.SOLVERS))
+def test_iterate_pagerank_solvers(directory, solver):
+    corpus = pagerank.crawl(directory)
+    ranks = pagerank.iterate_pagerank(corpus, pagerank.DAMPING, solver=solver, tolerance=1e-12, norm="l1")
+    assert as_vector(ranks) == pytest.approx(dense_pagerank(corpus, pagerank.DAMPING), abs=1e-9)
+
+
+@pytest.mark.parametrize("block_pages", [1, 7, 1000])
+def test_gauss_seidel_blocks(block_pages):
+    corpus, matrix = generated("dangling", 1000)
+    rank, stats = solvers.gauss_seidel(matrix, pagerank.DAMPING, tolerance=1e-10, block_pages=block_pages)
+    assert stats.converged
+    assert np.abs(rank - dense_pagerank(corpus, pagerank.DAMPING)).sum() < 1e-8
+
+
+def test_jacobi_contracts():
+    # every step shrinks the L1 change by at least the damping factor
+    _, matrix = generated("scale-free", 1000)
+    _, stats = solvers.jacobi(matrix, pagerank.DAMPING, tolerance=1e-12)
+    residuals = np.array(stats.residuals)
+    assert (residuals[1:] <= pagerank.DAMPING * residuals[:-1] + 1e-15).all()
+
+
+@pytest.mark.parametrize("backend", ["python", "numpy"])
+def test_iterate_pagerank_no_iterations(backend):
+    corpus = pagerank.crawl("corpus1")
+    ranks = pagerank.iterate_pagerank(corpus, pagerank.DAMPING, backend=backend, max_iterations=0)
+    assert ranks == pytest.approx({page: 1 / len(corpus) for page in corpus})
+
+
+def test_solver_errors():
+    corpus = pagerank.crawl("corpus0")
+    with pytest.raises(ValueError):
+        pagerank.iterate_pagerank(corpus, pagerank.DAMPING, backend="numpy", solver="newton")
+    with pytest.raises(ValueError):
+        pagerank.iterate_pagerank(corpus, pagerank.DAMPING, backend="python", solver="aitken")
+    for backend in ("python", "numpy"):
+        with pytest.raises(ValueError):
+            pagerank.iterate_pagerank(corpus, pagerank.DAMPING, backend=backend, norm="l2")
+
+
+@pytest.mark.parametrize("directory", CORPORA)
+def test_out_of_core_corpus(directory, tmp_path):
+    corpus = pagerank.crawl(directory)
+    outofcore.write_corpus(tmp_path, corpus)
+    edges = outofcore.EdgeList(tmp_path)
+    assert edges.page_count == len(corpus)
+    assert edges.link_count == sum(len(links) for links in corpus.values())
+    rank, stats = edges.pagerank(pagerank.DAMPING, tolerance=1e-12)
+    assert stats.converged
+    exact = dense_pagerank(corpus, pagerank.DAMPING)
+    assert rank == pytest.approx(exact, abs=1e-9)
+
+    # the best ranks in order, whichever of equal ranks comes first
+    best = outofcore.top_pages(tmp_path, 3)
+    assert [rank for _, rank in best] == pytest.approx(sorted(exact, reverse=True)[:3])
+    assert [rank[sorted(corpus).index(page)] for page, _ in best] == [rank for _, rank in best]
+
+
+def test_out_of_core_blocks(tmp_path, monkeypatch):
+    # links are sorted in several buckets and read in several blocks,
+    # and match the in-memory link matrix and jacobi
+    monkeypatch.setattr(outofcore, "BLOCK_EDGES", 1000)
+    _, matrix = generated("scale-free", 2000)
+    pages = [str(page) for page in matrix.pages]
+    links = [(pages[i], [pages[j] for j in matrix.out_links[matrix.out_offsets[i]:matrix.out_offsets[i + 1]]])
+             for i in range(matrix.page_count)]
+    # repeated links, links to the page itself and to unknown pages are dropped
+    links += [links[1], (pages[0], [pages[0], "elsewhere"])]
+    outofcore.write_edge_list(tmp_path, pages, links, bucket_edges=1500)
+    edges = outofcore.EdgeList(tmp_path)
+    assert edges.link_count == matrix.link_count
+    assert np.asarray(edges.degrees).tolist() == matrix.out_degree.tolist()
+
+    rank, stats = edges.pagerank(pagerank.DAMPING, tolerance=1e-10)
+    expected, expected_stats = solvers.jacobi(matrix, pagerank.DAMPING, tolerance=1e-10)
+    assert stats.iterations == expected_stats.iterations
+    assert rank == pytest.approx(expected, abs=1e-12)
+    assert np.fromfile(tmp_path / "ranks.bin").tolist() == rank.tolist()
+
+
+def test_out_of_core_version(tmp_path):
+    outofcore.write_corpus(tmp_path, pagerank.crawl("corpus0"))
+    (tmp_path / "graph.json").write_text('{"version": 0, "pages": 4, "links": 6}')
+    with pytest.raises(ValueError):
+        outofcore.EdgeList(tmp_path)
+
+
+@pytest.mark.parametrize("kind", benchmark.GRAPHS)
+def test_generate(kind):
+    sources, targets = benchmark.generate(kind, 1000)
+    assert (sources != targets).all()
+    assert 0 <= sources.min() and max(sources.max(), targets.max()) < 1000
+    # the same seed generates the same graph
+    again = benchmark.generate(kind, 1000)
+    assert sources.tolist() == again[0].tolist() and targets.tolist() == again[1].tolist()
+    dangling = LinkMatrix.from_edges(list(range(1000)), sources, targets).dangling.mean()
+    if kind == "dangling":
+        assert dangling == pytest.approx(0.6, abs=0.05)
+    else:
+        assert dangling < 0.05
+
+    with pytest.raises(ValueError):
+        benchmark.generate("complete", 10)
+
+
+def test_benchmark_run():
+    random.seed(0)
+    results = benchmark.run([100], progress=None)
+    assert len(results) == len(benchmark.GRAPHS) * len(benchmark.IMPLEMENTATIONS)
+    for result in results:
+        assert result["pages"] == 100
+        assert result["seconds"] >= 0
+        # tracemalloc sees neither pool workers nor mapped files
+        if result["implementation"] in benchmark.UNTRACED:
+            assert result["peak_bytes"] is None
+        else:
+            assert result["peak_bytes"] > 0
+        if "sample" in result["implementation"]:
+            assert result["l1_error"] < 0.2
+        elif result["implementation"] == "python-iterate":
+            # stops once no page moves more than 0.001
+            assert result["l1_error"] < 0.05
+        else:
+            assert result["l1_error"] < 1e-5
+
+    # the largest size of an implementation caps it
+    assert not benchmark.run([2000], ["random"], ["python-iterate"], progress=None)
+
+
+def test_benchmark_regressions():
+    def result(seconds, l1_error, implementation="jacobi"):
+        return {"graph": "random", "pages": 100, "implementation": implementation,
+                "seconds": seconds, "l1_error": l1_error}
+
+    baseline = [result(1.0, 1e-6), result(1.0, 0.01, "numpy-sample")]
+    assert benchmark.regressions(baseline, [result(1.2, 1e-6), result(1.0, 0.012, "numpy-sample")]) == []
+    slower, less_accurate = result(1.3, 1e-6), result(1.0, 0.02, "numpy-sample")
+    assert benchmark.regressions(baseline, [slower, less_accurate]) == [
+        (baseline[0], slower), (baseline[1], less_accurate)]
+    # errors at the reference's tolerance are never regressions
+    assert benchmark.regressions([result(1.0, 0)], [result(1.0, 1e-13)]) == []
+    # entries not in the baseline aren't compared
+    assert benchmark.regressions(baseline, [result(9.0, 1, "aitken")]) == []
+
+
+def principal_eigenvector(matrix):
+    """
+    Returns the eigenvector of the largest eigenvalue of a symmetric
+    matrix, scaled to sum to 1.
+    """
+    _, vectors = np.linalg.eigh(matrix)
+    vector = np.abs(vectors[:, -1])
+    return vector / vector.sum()
+
+
+@pytest.mark.parametrize("graph", CORPORA + benchmark.GRAPHS)
+def test_hits(graph):
+    corpus = pagerank.crawl(graph) if graph in CORPORA else generated(graph, 300)[0]
+    pages = sorted(corpus)
+    index = {page: i for i, page in enumerate(pages)}
+    links = np.zeros((len(pages), len(pages)))
+    for page, linked in corpus.items():
+        for link in linked:
+            links[index[page], index[link]] = 1
+
+    hubs, authorities, stats = hits.hits(LinkMatrix.from_corpus(corpus), tolerance=1e-12)
+    assert stats.converged
+    assert authorities == pytest.approx(principal_eigenvector(links.T @ links), abs=1e-10)
+    assert hubs == pytest.approx(principal_eigenvector(links @ links.T), abs=1e-10)
+
+
+def test_hits_no_links():
+    hubs, authorities, _ = hits.hits(LinkMatrix.from_corpus({"1": set(), "2": set()}))
+    assert not hubs.any() and not authorities.any()
+
+
+def test_score_corpus():
+    corpus = pagerank.crawl("corpus1")
+    scores = pagerank.score_corpus(corpus, pagerank.DAMPING)
+    assert scores.keys() == {"pagerank", "hubs", "authorities"}
+    for ranks in scores.values():
+        assert ranks.keys() == corpus.keys()
+        assert sum(ranks.values()) == pytest.approx(1)
+    assert as_vector(scores["pagerank"]) == pytest.approx(dense_pagerank(corpus, pagerank.DAMPING), abs=1e-5)
@@ -0,0 +1,171 @@
+"""
+Random surfer sampling for pagerank.py
+
+transition_model builds a distribution over the whole corpus for every
+single step. But the surfer's choice is only ever one of two uniform
+ones: with probability `damping_factor` one of the current page's links
+(if it has any), otherwise any page of the corpus. So a step is a coin
+flip plus one index into the page's slice of the link matrix, O(1)
+without building any distribution or alias table. The random numbers
+come from NumPy in batches, one call per few ten thousand steps.
+
+One surfer is one Markov chain and can't be split up, so
+parallel_pagerank runs many independent surfers across a process pool
+instead, each with its own random stream, and merges their visit counts.
+How much the surfers disagree also gives a confidence interval for every
+page's rank.
+"""
+import multiprocessing
+import os
+from statistics import NormalDist
+
+import numpy as np
+
+# steps whose random numbers are drawn at once
+BATCH = 1 << 16
+
+
+class Sampler():
+    """
+    Random surfer over the pages of a LinkMatrix.
+    """
+    def __init__(self, matrix, damping_factor, seed=None):
+        self.matrix = matrix
+        self.damping_factor = damping_factor
+        self.rng = np.random.default_rng(seed)
+        # plain lists index much faster than arrays one item at a time
+        self.offsets = matrix.out_offsets.tolist()
+        self.degree = matrix.out_degree.tolist()
+        self.links = matrix.out_links.tolist()
+
+    def step_randoms(self, count):
+        """
+        Returns (follow a link, which link, page to jump to) for `count` steps.
+        """
+        n = self.matrix.page_count
+        follow = (self.rng.random(count) < self.damping_factor).tolist()
+        # taken modulo the link count, the bias is far below 2 ** -40
+        pick = self.rng.integers(0, 1 << 62, count).tolist()
+        jump = self.rng.integers(0, n, count).tolist()
+        return follow, pick, jump
+
+    def walk(self, steps, start=None):
+        """
+        Walks `steps` pages starting at page index `start` (a random page
+        by default), returns how often every page index was visited.
+        """
+        n = self.matrix.page_count
+        visits = [0] * n
+        page = int(self.rng.integers(n)) if start is None else start
+        offsets, degree, links = self.offsets, self.degree, self.links
+
+        for batch in range(0, steps, BATCH):
+            follow, pick, jump = self.step_randoms(min(BATCH, steps - batch))
+            for f, k, j in zip(follow, pick, jump):
+                visits[page] += 1
+                d = degree[page]
+                # pages without links always jump anywhere
+                if d and f:
+                    page = links[offsets[page] + k % d]
+                else:
+                    page = j
+        return np.array(visits, dtype=np.int64)
+
+    def pagerank(self, steps, start=None):
+        """
+        Returns the share of `steps` samples every page index got.
+        """
+        return self.walk(steps, start) / steps
+
+
+class Estimate():
+    """
+    PageRank estimated from the visit counts of independent surfers.
+
+    `ranks[p]` is the estimated rank of page index p, the true rank is
+    within `ranks[p] +- half_width[p]` with probability `confidence`.
+    """
+    def __init__(self, ranks, half_width, confidence, samples, walkers):
+        self.ranks = ranks
+        self.half_width = half_width
+        self.confidence = confidence
+        self.samples = samples
+        self.walkers = walkers
+
+    def samples_needed(self, half_width):
+        """
+        Returns about how many samples in total bring the widest
+        interval down to +- `half_width`, the width shrinks with the
+        square root of the samples.
+        """
+        widest = float(self.half_width.max())
+        return int(np.ceil(self.samples * (widest / half_width) ** 2))
+
+
+def parallel_pagerank(matrix, damping_factor, samples, walkers=None, processes=None, seed=None,
+                      confidence=0.95):
+    """
+    Splits `samples` steps over `walkers` surfers run in a pool of
+    `processes` (1 runs them in this process), returns an Estimate.
+
+    There are 4 surfers per process by default, at least 2 are needed
+    for a confidence interval.
+    """
+    processes = processes or os.cpu_count()
+    walkers = walkers or 4 * processes
+    walkers = max(1, min(walkers, samples))
+    seeds = np.random.SeedSequence(seed).spawn(walkers)
+    tasks = [(seeds[w], samples // walkers + (w < samples % walkers)) for w in range(walkers)]
+
+    if processes == 1:
+        init_worker(matrix, damping_factor)
+        try:
+            counts = list(map(walk_task, tasks))
+        finally:
+            init_worker(None, None)
+    else:
+        with multiprocessing.Pool(processes, initializer=init_worker, initargs=(matrix, damping_factor)) as pool:
+            counts = pool.map(walk_task, tasks)
+    return merge(counts, [steps for _, steps in tasks], confidence)
+
+
+def merge(counts, steps, confidence):
+    """
+    Merges the visit counts of every surfer into one Estimate.
+
+    Visits within one surfer are correlated, so the interval comes from
+    the spread of the surfers' own estimates (batch means) rather than
+    from treating every sample as independent.
+    """
+    counts = np.array(counts, dtype=float)
+    steps = np.array(steps, dtype=float)
+    ranks = counts.sum(axis=0) / steps.sum()
+    walkers = len(steps)
+    if walkers < 2:
+        half_width = np.full(len(ranks), np.inf)
+    else:
+        # every surfer's estimate weighted by its share of the samples
+        weights = steps / steps.sum()
+        deviation = counts / steps[:, None] - ranks
+        variance = (weights[:, None] * deviation ** 2).sum(axis=0) / (walkers - 1)
+        z = NormalDist().inv_cdf((1 + confidence) / 2)
+        half_width = z * np.sqrt(variance)
+    return Estimate(ranks, half_width, confidence, int(steps.sum()), walkers)
+
+
+# Sampler of the current pool worker, see init_worker
+worker_sampler = None
+
+
+def init_worker(matrix, damping_factor):
+    """
+    Pool initializer, the link lists are converted once per worker.
+    """
+    global worker_sampler
+    worker_sampler = None if matrix is None else Sampler(matrix, damping_factor)
+
+
+def walk_task(task):
+    seed, steps = task
+    worker_sampler.rng = np.random.default_rng(seed)
+    return worker_sampler.walk(steps)
@@ -0,0 +1,246 @@
+"""
+PageRank solvers for pagerank.py
+
+All of them solve the same equations over a LinkMatrix and stop once
+the ranks change by at most `tolerance` in one iteration, measured by
+`norm`: "l1" for the total change over all pages, "max" for the change
+of the page moving the most (what iterate_pagerank always did).
+
+- jacobi: plain power iteration, every page's new rank only uses the
+  ranks of the previous iteration
+- gauss-seidel: pages are updated in order and later ones already use
+  the new ranks, done a block of pages at a time to stay vectorized
+- aitken: power iteration that every few iterations extrapolates every
+  page's rank from its last three values (Aitken's delta-squared),
+  skipping ahead on slowly converging pages
+
+Every solver returns the rank vector and a SolverStats.
+"""
+import time
+
+import numpy as np
+
+from linkmatrix import segment_sum
+
+TOLERANCE = 1e-6
+
+MAX_ITERATIONS = 1000
+
+# pages updated together by gauss-seidel
+BLOCK_PAGES = 4096
+
+# iterations between two aitken extrapolations
+AITKEN_PERIOD = 10
+
+# pages converging slower than this aren't extrapolated, the jump
+# would be huge and rest on a ratio that isn't settled yet
+MAX_RATIO = 0.95
+
+
+class SolverStats():
+    """
+    How a solver got to its ranks: the change of every iteration under
+    the norm used, and the wall time.
+    """
+    def __init__(self, solver, norm, tolerance):
+        self.solver = solver
+        self.norm = norm
+        self.tolerance = tolerance
+        self.residuals = []
+        self.seconds = 0.0
+        self.converged = False
+        self.started = time.perf_counter()
+
+    @property
+    def iterations(self):
+        return len(self.residuals)
+
+    def record(self, change):
+        """
+        Records the change vector of one iteration, returns whether
+        that converged.
+        """
+        residual = float(change.sum() if self.norm == "l1" else change.max())
+        self.residuals.append(residual)
+        self.converged = residual <= self.tolerance
+        return self.converged
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self.started
+        return self
+
+    def __repr__(self):
+        return (f"SolverStats({self.solver}: {self.iterations} iterations, "
+                f"residual {self.residuals[-1] if self.residuals else None}, {self.seconds:.3f}s)")
+
+
+def check_norm(norm):
+    if norm not in ("l1", "max"):
+        raise ValueError(f"unknown norm: {norm}")
+
+
+def jacobi(matrix, damping_factor, tolerance=TOLERANCE, max_iterations=MAX_ITERATIONS, norm="l1"):
+    """
+    Power iteration from the uniform vector with preallocated double
+    buffers. Pages without links are a rank-one correction: their total
+    rank goes to every page as one number.
+    """
+    check_norm(norm)
+    stats = SolverStats("jacobi", norm, tolerance)
+    n = matrix.page_count
+    rank = np.full(n, 1 / n)
+    following = np.empty(n)
+    change = np.empty(n)
+    dangling = matrix.dangling.astype(float)
+    while stats.iterations < max_iterations:
+        power_step(matrix, damping_factor, rank, following, dangling)
+        np.subtract(following, rank, out=change)
+        np.abs(change, out=change)
+        rank, following = following, rank
+        if stats.record(change):
+            break
+    return rank, stats.finish()
+
+
+def power_step(matrix, damping_factor, rank, out, dangling):
+    """
+    Writes one power iteration step from `rank` to `out`.
+    """
+    n = matrix.page_count
+    matrix.spread(rank, out)
+    # teleporting plus the rank of dangling pages, which link everywhere
+    base = (1 - damping_factor) / n + damping_factor * np.dot(dangling, rank) / n
+    np.multiply(out, damping_factor, out=out)
+    np.add(out, base, out=out)
+    return out
+
+
+def gauss_seidel(matrix, damping_factor, tolerance=TOLERANCE, max_iterations=MAX_ITERATIONS, norm="l1",
+                 block_pages=None):
+    """
+    Sweeps over the pages in blocks of `block_pages`, every block is
+    computed from the newest ranks of all pages before it. Blocks of one
+    page are exact Gauss-Seidel, by default small corpora get those and
+    big ones blocks of BLOCK_PAGES.
+    """
+    check_norm(norm)
+    stats = SolverStats("gauss-seidel", norm, tolerance)
+    d = damping_factor
+    n = matrix.page_count
+    if block_pages is None:
+        block_pages = max(1, min(BLOCK_PAGES, n // 64))
+    blocks = block_plans(matrix.in_plan, n, block_pages)
+
+    rank = np.full(n, 1 / n)
+    previous = np.empty(n)
+    change = np.empty(n)
+    # what every page hands each of its links, plus the slot holding 0
+    contribution = np.zeros(n + 1)
+    np.multiply(rank, matrix.inverse_degree, out=contribution[:-1])
+    gathered = np.empty(len(matrix.in_plan[0]))
+    dangling_rank = float(rank[matrix.dangling].sum())
+
+    while stats.iterations < max_iterations:
+        previous[:] = rank
+        for start, stop, plan in blocks:
+            block = rank[start:stop]
+            old_dangling = float(block[matrix.dangling[start:stop]].sum())
+            segment_sum(contribution, plan, gathered[:len(plan[0])], block)
+            block *= d
+            block += (1 - d) / n + d * dangling_rank / n
+            np.multiply(block, matrix.inverse_degree[start:stop], out=contribution[start:stop])
+            dangling_rank += float(block[matrix.dangling[start:stop]].sum()) - old_dangling
+
+        np.subtract(rank, previous, out=change)
+        np.abs(change, out=change)
+        if stats.record(change):
+            break
+    return rank / rank.sum(), stats.finish()
+
+
+def block_plans(plan, n, block_pages):
+    """
+    Cuts a gather_plan over all pages into (start, stop, plan) for
+    every block of `block_pages` pages.
+    """
+    index, starts = plan
+    blocks = []
+    for start in range(0, n, block_pages):
+        stop = min(start + block_pages, n)
+        end = starts[stop] if stop < n else len(index)
+        blocks.append((start, stop, (index[starts[start]:end], starts[start:stop] - starts[start])))
+    return blocks
+
+
+def aitken(matrix, damping_factor, tolerance=TOLERANCE, max_iterations=MAX_ITERATIONS, norm="l1",
+           period=AITKEN_PERIOD):
+    """
+    Power iteration extrapolated every `period` iterations. Where the
+    last three values of a page are x0, x1, x2 its rank is taken to be
+
+        x2 - (x2 - x1) ** 2 / (x2 - 2 x1 + x0)
+
+    which is exact if the page converges geometrically, see extrapolate.
+    The result is clipped to be non-negative and normalized again.
+    """
+    check_norm(norm)
+    stats = SolverStats("aitken", norm, tolerance)
+    n = matrix.page_count
+    dangling = matrix.dangling.astype(float)
+    # the last three iterates, the newest one is rank
+    older, old, rank = np.empty(n), np.empty(n), np.full(n, 1 / n)
+    following = np.empty(n)
+    change = np.empty(n)
+    step = np.empty(n)
+    curve = np.empty(n)
+
+    while stats.iterations < max_iterations:
+        power_step(matrix, damping_factor, rank, following, dangling)
+        np.subtract(following, rank, out=change)
+        np.abs(change, out=change)
+        older, old, rank, following = old, rank, following, older
+        if stats.record(change):
+            break
+
+        if stats.iterations >= 3 and stats.iterations % period == 0:
+            extrapolate(older, old, rank, step, curve)
+    return rank, stats.finish()
+
+
+def extrapolate(x0, x1, x2, ratio, jump):
+    """
+    Aitken's extrapolation of x2 in place. With q the ratio of the last
+    two steps it is x2 + (x2 - x1) q / (1 - q), only used where the
+    steps have the same sign and shrink, elsewhere one page's noise
+    could throw its rank far off.
+    """
+    np.subtract(x1, x0, out=jump)
+    np.subtract(x2, x1, out=ratio)
+    usable = jump != 0
+    np.divide(ratio, jump, out=ratio, where=usable)
+    usable &= (ratio > 0) & (ratio < MAX_RATIO)
+
+    # jump = (x2 - x1) q / (1 - q)
+    np.subtract(x2, x1, out=jump)
+    jump *= ratio
+    np.divide(jump, 1 - ratio, out=jump, where=usable)
+    jump[~usable] = 0
+    x2 += jump
+    np.maximum(x2, 0, out=x2)
+    x2 /= x2.sum()
+
+
+SOLVERS = {
+    "jacobi": jacobi,
+    "gauss-seidel": gauss_seidel,
+    "aitken": aitken,
+}
+
+
+def solve(matrix, damping_factor, solver="jacobi", **options):
+    """
+    Runs a solver by name, returns (rank vector, SolverStats).
+    """
+    if solver not in SOLVERS:
+        raise ValueError(f"unknown solver: {solver}")
+    return SOLVERS[solver](matrix, damping_factor, **options)